@@ -1,13 +1,34 @@
 from datetime import datetime, timedelta
+import asyncio
+import multiprocessing
 import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
+import metrics
+from errors import AppError
+
 SECRET_KEY = os.getenv("JWT_SECRET", "change_me_in_prod")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# raising the cost rehashes existing users transparently on their next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# "process" sidesteps the GIL entirely, "thread" is enough when bcrypt releases it
+PASSWORD_POOL = os.getenv("PASSWORD_POOL", "process")
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 2)))
+# hashes queued or running before new ones are rejected with 503
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor: Optional[Executor] = None
+_pending = 0
+# running estimate of one verification, used to pad logins for unknown users
+_verify_seconds = 0.2
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -17,9 +38,75 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """ Verify, and return a new hash when the stored one uses outdated settings """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_POOL == "thread":
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+        else:
+            # spawn: forking a process that already runs an event loop and threads is unsafe
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _executor
+
+
+async def _run_password_job(operation: str, fn, *args):
+    global _pending
+    if _pending >= PASSWORD_MAX_PENDING:
+        metrics.PASSWORD_JOBS_REJECTED.inc()
+        raise AppError(
+            "AUTH_OVERLOADED",
+            "Too many sign-in requests, please retry shortly",
+            status_code=503,
+        )
+    _pending += 1
+    metrics.PASSWORD_JOBS_PENDING.inc()
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+        metrics.PASSWORD_JOBS_PENDING.dec()
+        metrics.PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job("hash", hash_password, password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    global _verify_seconds
+    started = time.monotonic()
+    result = await _run_password_job("verify", verify_and_update, plain_password, hashed_password)
+    _verify_seconds = 0.9 * _verify_seconds + 0.1 * (time.monotonic() - started)
+    return result
+
+
+async def dummy_verify() -> None:
+    """
+    Take as long as a real verification without burning a bcrypt round, so
+    unknown identifiers cannot be told apart from wrong passwords by timing.
+    """
+    await asyncio.sleep(_verify_seconds)
+
+
+def shutdown_password_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
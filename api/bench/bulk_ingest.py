@@ -0,0 +1,97 @@
+"""
+Post ingestion throughput, one create_post-style round trip per row vs the
+batched NDJSON import behind POST /posts/bulk.
+
+    cd api && python -m bench.bulk_ingest --user-id 1 --rows 20000 --batch-size 1000
+
+Needs DATABASE_URL and REDIS_URL pointing at a disposable database (the
+docker-compose stack is fine); every row it writes is deleted afterwards.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import orjson
+from sqlalchemy import delete
+
+from database import AsyncSessionLocal, async_engine
+from models import Post
+from services import posts as post_service
+from services import totals
+
+TITLE_PREFIX = "bench-bulk-ingest"
+
+
+def make_lines(n: int) -> list:
+    return [
+        orjson.dumps({"title": f"{TITLE_PREFIX} {i}", "content": "lorem ipsum dolor sit amet " * 20})
+        for i in range(n)
+    ]
+
+
+async def per_row(user_id: int, lines: list) -> None:
+    # the old path: insert, commit, refresh for every post
+    async with AsyncSessionLocal() as db:
+        for line in lines:
+            data = orjson.loads(line)
+            post = Post(title=data["title"], content=data["content"], user_id=user_id)
+            db.add(post)
+            await totals.adjust_post_counts(db, user_id, 1)
+            await db.commit()
+            await db.refresh(post)
+
+
+async def bulk(user_id: int, lines: list, batch_size: int, chunk_bytes: int) -> None:
+    body = b"\n".join(lines) + b"\n"
+
+    async def chunks():
+        for start in range(0, len(body), chunk_bytes):
+            yield body[start:start + chunk_bytes]
+
+    async with AsyncSessionLocal() as db:
+        result = await post_service.bulk_create_posts(db, user_id=user_id, chunks=chunks(), batch_size=batch_size)
+    assert result.failed == 0, result.errors[:5]
+
+
+async def cleanup() -> None:
+    # both paths count their rows into row_counts and users.posts_count, take them back out
+    async with AsyncSessionLocal() as db:
+        authors = (await db.scalars(
+            delete(Post).where(Post.title.like(f"{TITLE_PREFIX} %")).returning(Post.user_id)
+        )).all()
+        for author_id, deleted in Counter(authors).items():
+            await totals.adjust_post_counts(db, author_id, -deleted)
+        await db.commit()
+
+
+async def timed(label: str, rows: int, fn) -> None:
+    start = time.perf_counter()
+    await fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s  {rows / elapsed:10.0f} rows/s")
+    await cleanup()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--per-row-rows", type=int, default=2000, help="the per-row path is slow, run fewer rows")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--chunk-bytes", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    await cleanup()
+    await timed("per row (insert/commit/refresh)", args.per_row_rows, lambda: per_row(args.user_id, make_lines(args.per_row_rows)))
+    for batch_size in sorted({100, args.batch_size}):
+        await timed(
+            f"bulk, batch_size={batch_size}",
+            args.rows,
+            lambda: bulk(args.user_id, make_lines(args.rows), batch_size, args.chunk_bytes),
+        )
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,208 @@
+"""
+EXPLAIN every hot service query and fail if any of them plans a sequential
+scan on a large table.
+
+    cd api && python -m bench.explain_audit --seed 200000
+    cd api && python -m bench.explain_audit            # reuse already seeded data
+
+Postgres only. --seed bulk-inserts that many posts (plus users, comments and
+follows proportionally) with generate_series and runs ANALYZE, so the planner
+sees production-like sizes; --cleanup removes the seeded rows afterwards.
+Exit status is 1 when a query seq scans one of LARGE_TABLES.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import Select, delete, desc, select, text, tuple_
+
+from database import AsyncSessionLocal, async_engine
+from models import Comments, Follow, Post, User
+from services import comments as comments_service
+from services import feed as feed_service
+from services import posts as post_service
+
+LARGE_TABLES = {"posts", "comments", "follows", "users"}
+SEED_PREFIX = "explain-audit"
+LIMIT = 11
+
+
+async def seed(db, posts: int) -> None:
+    users = max(posts // 50, 10)
+    await db.execute(text(
+        """
+        INSERT INTO users (username, email, password_hash, created_at, updated_at, followers_count, posts_count)
+        SELECT :prefix || '-' || g, :prefix || '-' || g || '@example.com', 'x', now(), now(), 0, 0
+        FROM generate_series(1, :users) AS g
+        """
+    ), {"prefix": SEED_PREFIX, "users": users})
+    await db.execute(text(
+        """
+        INSERT INTO posts (title, content, created_at, updated_at, user_id, likes, is_published, comments_count)
+        SELECT 'post ' || g, repeat('lorem ipsum dolor sit amet ', 10) || g,
+               now() - g * interval '1 minute', now() - g * interval '1 minute',
+               u.ids[1 + g % array_length(u.ids, 1)], 0, true, 0
+        FROM generate_series(1, :posts) AS g,
+             (SELECT array_agg(id) AS ids FROM users WHERE username LIKE :prefix || '-%') AS u
+        """
+    ), {"prefix": SEED_PREFIX, "posts": posts})
+    await db.execute(text(
+        """
+        INSERT INTO comments (content, created_at, updated_at, post_id, user_id)
+        SELECT 'comment ' || g, now() - g * interval '1 second', now() - g * interval '1 second', p.id, p.user_id
+        FROM (SELECT id, user_id FROM posts WHERE user_id IN (SELECT id FROM users WHERE username LIKE :prefix || '-%')) AS p,
+             generate_series(1, 3) AS g
+        """
+    ), {"prefix": SEED_PREFIX})
+    await db.execute(text(
+        """
+        INSERT INTO follows (follower_id, followee_id, created_at)
+        SELECT a.id, b.id, now()
+        FROM users a JOIN users b ON b.id <> a.id AND (a.id + b.id) % 7 = 0
+        WHERE a.username LIKE :prefix || '-%' AND b.username LIKE :prefix || '-%'
+        ON CONFLICT DO NOTHING
+        """
+    ), {"prefix": SEED_PREFIX})
+    # keep the maintained totals honest
+    await db.execute(text("UPDATE row_counts SET count = (SELECT COUNT(*) FROM posts) WHERE name = 'posts'"))
+    await db.execute(text(
+        """
+        UPDATE users SET posts_count = (SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id)
+        WHERE username LIKE :prefix || '-%'
+        """
+    ), {"prefix": SEED_PREFIX})
+    await db.commit()
+    for table in sorted(LARGE_TABLES):
+        await db.execute(text(f"ANALYZE {table}"))
+    await db.commit()
+    print(f"seeded {posts} posts for {users} users")
+
+
+async def cleanup(db) -> None:
+    # posts.user_id is SET NULL on delete, so posts go first; comments and follows cascade
+    seeded = select(User.id).where(User.username.like(f"{SEED_PREFIX}-%"))
+    await db.execute(delete(Post).where(Post.user_id.in_(seeded)))
+    await db.execute(delete(User).where(User.id.in_(seeded)))
+    await db.execute(text("UPDATE row_counts SET count = (SELECT COUNT(*) FROM posts) WHERE name = 'posts'"))
+    await db.commit()
+
+
+async def sample(db) -> Tuple[int, Post]:
+    """ A busy author and post to parameterize the queries with """
+    author_id = await db.scalar(select(Post.user_id).where(Post.user_id.is_not(None)).order_by(desc(Post.id)).limit(1))
+    post = await db.scalar(select(Post).order_by(desc(Post.comments_count)).limit(1))
+    return author_id, post
+
+
+async def queries(db) -> List[Tuple[str, Select]]:
+    """ Statements as the services build them, so the audit cannot drift from the code """
+    author_id, post = await sample(db)
+    post_id = post.id
+    comment_key = tuple_(Comments.created_at, Comments.id) < tuple_(datetime.utcnow(), 2**31 - 1)
+
+    async def listing(label: str, *, sort_by: str, descending: bool, author: Optional[int] = None,
+                      search: Optional[str] = None, keyset: bool = False, offset: int = 0):
+        stmt = await post_service._filtered_query(db, search=search, author_id=author)
+        position = None
+        if keyset:
+            value = post.created_at.isoformat() if sort_by == "created_at" else post.title
+            position = {"v": value, "id": post.id}
+        stmt = post_service._seek(stmt, position=position, sort_by=sort_by, descending=descending)
+        return label, stmt.offset(offset).limit(LIMIT)
+
+    return [
+        await listing("posts: newest first (offset page 1)", sort_by="created_at", descending=True),
+        await listing("posts: newest first (offset page 50)", sort_by="created_at", descending=True, offset=49 * 10),
+        await listing("posts: keyset, created_at desc", sort_by="created_at", descending=True, keyset=True),
+        await listing("posts: keyset, created_at asc", sort_by="created_at", descending=False, keyset=True),
+        await listing("posts: title asc (offset page 1)", sort_by="title", descending=False),
+        await listing("posts: title desc (offset page 1)", sort_by="title", descending=True),
+        await listing("posts: keyset, title asc", sort_by="title", descending=False, keyset=True),
+        await listing("posts: keyset, title desc", sort_by="title", descending=True, keyset=True),
+        await listing("posts: by author, newest first", sort_by="created_at", descending=True, author=author_id),
+        await listing("posts: by author, keyset", sort_by="created_at", descending=True, author=author_id, keyset=True),
+        await listing("posts: search", sort_by="created_at", descending=True, search="lorem"),
+        await listing("posts: search by author", sort_by="created_at", descending=True, search="lorem", author=author_id),
+        ("posts: multi-get by id",
+         select(Post).where(Post.id.in_([post_id, post_id - 1, post_id - 2]))),
+        ("posts: export by author",
+         post_service.export_posts_query(author_id=author_id, created_after=None, created_before=None)),
+        ("posts: export by created_at range",
+         post_service.export_posts_query(author_id=None, created_after=post.created_at, created_before=datetime.utcnow())),
+        ("feed: pull authors' posts",
+         feed_service._pull_query([author_id], {"v": feed_service.post_score(post.created_at), "id": post_id}, LIMIT)),
+        ("feed: followers of an author",
+         select(Follow.follower_id).where(Follow.followee_id == author_id)),
+        ("feed: followees of a user",
+         select(Follow.followee_id).join(User, User.id == Follow.followee_id)
+         .where(Follow.follower_id == author_id, User.followers_count > 1000)),
+        ("comments: newest first (offset page 1)",
+         select(Comments).where(Comments.post_id == post_id)
+         .order_by(Comments.created_at.desc(), Comments.id.desc()).limit(LIMIT)),
+        ("comments: keyset",
+         select(Comments).where(Comments.post_id == post_id, comment_key)
+         .order_by(desc(Comments.created_at), desc(Comments.id)).limit(LIMIT)),
+        ("comments: export",
+         comments_service.export_comments_query(post_id, None, None)),
+        ("users: login lookup",
+         select(User).where((User.username == "someone") | (User.email == "someone@example.com")).limit(1)),
+        ("users: authors multi-get",
+         select(User.id, User.username).where(User.id.in_([author_id]))),
+    ]
+
+
+def walk(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from walk(child)
+
+
+async def explain(db, stmt: Select) -> dict:
+    sql = stmt.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = await db.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    if isinstance(plan, (str, bytes)):
+        plan = orjson.loads(plan)
+    return plan[0]["Plan"]
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0, help="posts to generate before auditing")
+    parser.add_argument("--cleanup", action="store_true", help="delete the seeded rows when done")
+    parser.add_argument("--verbose", action="store_true", help="print every plan node")
+    args = parser.parse_args()
+
+    failures = 0
+    async with AsyncSessionLocal() as db:
+        if db.bind.dialect.name != "postgresql":
+            print("explain audit needs Postgres", file=sys.stderr)
+            return 2
+        if args.seed:
+            await seed(db, args.seed)
+
+        for label, stmt in await queries(db):
+            plan = await explain(db, stmt)
+            seq_scans = sorted({
+                node["Relation Name"] for node in walk(plan)
+                if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES
+            })
+            status = "SEQ SCAN " + ", ".join(seq_scans) if seq_scans else "ok"
+            print(f"{label:<40} {plan['Node Type']:<20} rows={plan['Plan Rows']:<8} {status}")
+            if args.verbose:
+                for node in walk(plan):
+                    print(f"    {node['Node Type']} {node.get('Relation Name', '')} {node.get('Index Name', '')}")
+            failures += bool(seq_scans)
+
+        if args.cleanup:
+            await cleanup(db)
+
+    await async_engine.dispose()
+    print(f"{failures} quer{'y' if failures == 1 else 'ies'} with sequential scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
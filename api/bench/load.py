@@ -0,0 +1,264 @@
+"""
+Drive the API hot paths at a fixed concurrency and record throughput and
+latency percentiles per scenario, as JSON for comparing commits.
+
+    cd api && python -m bench.seed --posts 1000000 --comments 10000000
+    cd api && python -m bench.load --base-url http://localhost:8000 --concurrency 32 --duration 30
+    cd api && python -m bench.load --compare bench/results/<old>.json bench/results/<new>.json
+
+Needs httpx (pip install httpx) and an API with Redis at REDIS_URL, which the
+per-route rate limiter connects to at startup whatever CACHE_BACKEND says.
+That limiter keys on X-Forwarded-For, which every request here sets to a
+fresh address so it stays out of the measurements. The login throttle keys on
+the socket address instead, so run the API with LOGIN_MAX_ATTEMPTS_PER_IP
+raised for the login scenario. Results go to bench/results/ (git-ignored),
+named after the time and the current git commit.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+OK_STATUSES = frozenset({200, 201, 304})
+# created by bench.seed; not imported from there so the driver runs without the API's dependencies
+BENCH_USERNAME = "bench"
+BENCH_PASSWORD = "bench-password"
+
+
+class Context:
+    """ Ids and tokens discovered before the run, shared by every scenario """
+
+    def __init__(self, token: str, post_ids: List[int], deep_page: int) -> None:
+        self.token = token
+        self.post_ids = post_ids
+        self.deep_page = deep_page
+
+
+Scenario = Callable[[httpx.AsyncClient, Context], Awaitable[httpx.Response]]
+
+
+def _headers(extra: Dict[str, str] | None = None) -> Dict[str, str]:
+    # a fresh client address per request keeps the per-IP rate limiter out of the numbers
+    headers = {"X-Forwarded-For": f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"}
+    if extra:
+        headers.update(extra)
+    return headers
+
+
+async def posts_first_page(client, ctx):
+    return await client.get("/posts", params={"limit": 10}, headers=_headers())
+
+
+async def posts_deep_page(client, ctx):
+    return await client.get("/posts", params={"limit": 10, "page": ctx.deep_page}, headers=_headers())
+
+
+async def posts_search(client, ctx):
+    term = random.choice(["lorem", "ipsum", "dolor", "consectetur", "post 12"])
+    return await client.get("/posts", params={"limit": 10, "search": term}, headers=_headers())
+
+
+async def posts_cursor(client, ctx):
+    return await client.get("/posts", params={"limit": 10, "pagination": "cursor"}, headers=_headers())
+
+
+async def post_detail(client, ctx):
+    return await client.get(f"/post/{random.choice(ctx.post_ids)}", headers=_headers())
+
+
+async def post_comments(client, ctx):
+    return await client.get(f"/post/{random.choice(ctx.post_ids)}/comments", params={"limit": 10}, headers=_headers())
+
+
+async def login(client, ctx):
+    return await client.post(
+        "/login", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}, headers=_headers()
+    )
+
+
+async def create_post(client, ctx):
+    return await client.post(
+        "/post",
+        json={"title": "bench post", "content": "written by bench.load"},
+        headers=_headers({"Authorization": f"Bearer {ctx.token}"}),
+    )
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "posts_first_page": posts_first_page,
+    "posts_deep_page": posts_deep_page,
+    "posts_search": posts_search,
+    "posts_cursor": posts_cursor,
+    "post_detail": post_detail,
+    "post_comments": post_comments,
+    "login": login,
+    "create_post": create_post,
+}
+
+
+async def prepare(client: httpx.AsyncClient) -> Context:
+    response = await client.post(
+        "/login", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}, headers=_headers()
+    )
+    response.raise_for_status()
+    token = response.json()["access_token"]
+
+    response = await client.get("/posts", params={"limit": 100}, headers=_headers())
+    response.raise_for_status()
+    page = response.json()
+    post_ids = [item["id"] for item in page["items"]]
+    if not post_ids:
+        sys.exit("no posts to read, run python -m bench.seed first")
+    # halfway through the listing at limit=10
+    deep_page = max(1, (page.get("total") or 0) // 20)
+    return Context(token, post_ids, deep_page)
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    latencies.sort()
+    count = len(latencies)
+    errors = sum(n for status, n in statuses.items() if status not in OK_STATUSES)
+    if count >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+async def run_scenario(client, ctx, scenario: Scenario, concurrency: int, duration: float, warmup: float) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def worker() -> None:
+        while True:
+            start = time.perf_counter()
+            if start >= deadline:
+                return
+            try:
+                status = (await scenario(client, ctx)).status_code
+            except httpx.HTTPError:
+                status = 0
+            if start >= measure_from:
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, duration)
+
+
+def git_revision() -> dict:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        ctx = await prepare(client)
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(client, ctx, SCENARIOS[name], args.concurrency, args.duration, args.warmup)
+            r = results[name]
+            print(f"{name:<18} {r['rps']:9.1f} req/s  p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  "
+                  f"p99 {r['p99_ms']:8.2f} ms  errors {r['errors']}")
+
+    return {
+        "meta": {
+            **git_revision(),
+            "label": args.label,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+
+
+def save(report: dict, output: str | None) -> str:
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['meta']['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return output
+
+
+def compare(old_path: str, new_path: str, tolerance: float) -> int:
+    """ Print per-scenario deltas; exit 1 if p95 or throughput regressed by more than tolerance """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+
+    regressions = 0
+    for name, after in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if before is None:
+            continue
+        deltas = {}
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            deltas[metric] = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+        worse = deltas["p95_ms"] > tolerance or -deltas["rps"] > tolerance
+        regressions += worse
+        print(f"{name:<18} " + "  ".join(f"{metric} {delta:+7.1%}" for metric, delta in deltas.items())
+              + ("  REGRESSION" if worse else ""))
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", help="results file, default bench/results/<time>-<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95/throughput regression for --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, args.tolerance)
+
+    report = asyncio.run(run(args))
+    print(f"results written to {save(report, args.output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Per-request overhead of the request-id middleware, BaseHTTPMiddleware version
+vs the plain ASGI one, measured by calling the ASGI app directly (no sockets).
+
+    cd api && python -m bench.middleware --requests 20000
+
+bare:   the endpoint with no middleware
+legacy: the old BaseHTTPMiddleware implementation, kept here for comparison
+asgi:   middleware.request_id.RequestIdMiddleware, access log sampled at --sample-rate
+Each line reports the mean per request and the overhead over bare.
+"""
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from logging_config import get_logger, set_request_id
+from middleware.request_id import RequestIdMiddleware
+
+logger = get_logger("bench.middleware")
+
+
+class LegacyRequestIdMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        request_id = request.headers.get("x-request-id") or str(uuid.uuid4())
+        set_request_id(request_id)
+        logger.info(f"Incoming request {request.method} {request.url.path}")
+        response = await call_next(request)
+        response.headers["x-request-id"] = request_id
+        logger.info(f"Completed request {request.method} {request.url.path} with status {response.status_code}")
+        return response
+
+
+async def endpoint(request):
+    return PlainTextResponse("ok")
+
+
+def build(middleware=()) -> Starlette:
+    return Starlette(routes=[Route("/", endpoint)], middleware=list(middleware))
+
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/",
+    "raw_path": b"/",
+    "query_string": b"",
+    "root_path": "",
+    "headers": [(b"host", b"bench")],
+    "client": ("127.0.0.1", 1234),
+    "server": ("bench", 80),
+}
+
+
+async def drive(app, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    parser.add_argument("--log", action="store_true", help="let log lines reach the handlers (stdout)")
+    args = parser.parse_args()
+
+    # by default measure the middleware itself, not the cost of writing to a terminal
+    logging.getLogger("microblog").setLevel(logging.INFO if args.log else logging.CRITICAL)
+
+    apps = {
+        "bare": build(),
+        "legacy": build([Middleware(LegacyRequestIdMiddleware)]),
+        "asgi": build([Middleware(RequestIdMiddleware, sample_rate=args.sample_rate)]),
+    }
+    for app in apps.values():
+        await drive(app, 500)  # warm up
+
+    bare = None
+    for name, app in apps.items():
+        us = await drive(app, args.requests)
+        bare = us if bare is None else bare
+        print(f"{name:<8} {us:8.1f} us/request  overhead {us - bare:7.1f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
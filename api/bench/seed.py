@@ -0,0 +1,179 @@
+"""
+Seed the database the API points at with benchmark volumes.
+
+    cd api && python -m bench.seed --users 10000 --posts 1000000 --comments 10000000
+    cd api && python -m bench.seed --reset            # remove a previous seed first
+
+Works against DATABASE_URL, Postgres (generate_series, in chunks) or SQLite
+(batched executemany). Seeded users are named seed-<n>; a login user
+"bench" / "bench-password" is created for the load test. Maintained counters
+(row_counts, users.posts_count, posts.comments_count) are brought up to date
+afterwards so the API sees a consistent dataset. Redis needs no seeding, but
+flush it so no cached pages from an earlier dataset survive. It cannot be left
+out: the route rate limiter is initialised against it at startup, and likes
+always use it. CACHE_BACKEND=memory only moves the response caches and the
+login throttle into the API process.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, text
+
+from auth import hash_password
+from database import SessionLocal, engine
+from models import Comments, Post, User
+
+SEED_PREFIX = "seed"
+BENCH_USERNAME = "bench"
+BENCH_PASSWORD = "bench-password"
+CHUNK = 1_000_000
+SQLITE_BATCH = 10_000
+CONTENT = "lorem ipsum dolor sit amet consectetur adipiscing elit " * 6
+
+
+def is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def seeded_user_ids():
+    return select(User.id).where(User.username.like(f"{SEED_PREFIX}-%"))
+
+
+def reset(db) -> None:
+    # posts.user_id is SET NULL on delete, so posts go first; comments and follows cascade
+    db.execute(delete(Post).where(Post.user_id.in_(seeded_user_ids())))
+    db.execute(delete(User).where(User.id.in_(seeded_user_ids())))
+    db.commit()
+
+
+def seed_users(db, users: int) -> None:
+    now = datetime.utcnow()
+    for start in range(0, users, SQLITE_BATCH):
+        db.execute(insert(User), [
+            {
+                "username": f"{SEED_PREFIX}-{i}",
+                "email": f"{SEED_PREFIX}-{i}@example.com",
+                "password_hash": "!",  # not a valid hash, seeded users cannot log in
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(start, min(start + SQLITE_BATCH, users))
+        ])
+    if db.scalar(select(User.id).where(User.username == BENCH_USERNAME)) is None:
+        db.execute(insert(User), [{
+            "username": BENCH_USERNAME,
+            "email": f"{BENCH_USERNAME}@example.com",
+            "password_hash": hash_password(BENCH_PASSWORD),
+            "created_at": now,
+            "updated_at": now,
+        }])
+    db.commit()
+
+
+def seed_posts(db, posts: int, user_ids: list) -> None:
+    if is_postgres():
+        for start in range(0, posts, CHUNK):
+            db.execute(text(
+                """
+                INSERT INTO posts (title, content, created_at, updated_at, user_id, likes, is_published, comments_count)
+                SELECT 'post ' || g, :content || g,
+                       now() - g * interval '1 second', now() - g * interval '1 second',
+                       (:user_ids)[1 + g % cardinality(CAST(:user_ids AS integer[]))], 0, true, 0
+                FROM generate_series(:start, :stop) AS g
+                """
+            ), {"content": CONTENT, "user_ids": user_ids, "start": start + 1, "stop": min(start + CHUNK, posts)})
+            db.commit()
+            print(f"  posts {min(start + CHUNK, posts)}/{posts}")
+        return
+
+    now = datetime.utcnow()
+    for start in range(0, posts, SQLITE_BATCH):
+        db.execute(insert(Post), [
+            {
+                "title": f"post {i}",
+                "content": f"{CONTENT}{i}",
+                "created_at": now - timedelta(seconds=i),
+                "updated_at": now - timedelta(seconds=i),
+                "user_id": user_ids[i % len(user_ids)],
+                "likes": 0,
+                "is_published": True,
+            }
+            for i in range(start, min(start + SQLITE_BATCH, posts))
+        ])
+        db.commit()
+
+
+def seed_comments(db, comments: int, user_ids: list) -> None:
+    seeded_posts = select(Post.id).where(Post.user_id.in_(seeded_user_ids()))
+    first = db.scalar(seeded_posts.order_by(Post.id).limit(1))
+    last = db.scalar(seeded_posts.order_by(Post.id.desc()).limit(1))
+    if first is None:
+        return
+
+    if is_postgres():
+        for start in range(0, comments, CHUNK):
+            db.execute(text(
+                """
+                INSERT INTO comments (content, created_at, updated_at, post_id, user_id)
+                SELECT 'comment ' || g, now() - g * interval '1 second', now() - g * interval '1 second',
+                       :first + (hashint4(g) & 2147483647) % (:last - :first + 1),
+                       (:user_ids)[1 + g % cardinality(CAST(:user_ids AS integer[]))]
+                FROM generate_series(:start, :stop) AS g
+                """
+            ), {
+                "first": first, "last": last, "user_ids": user_ids,
+                "start": start + 1, "stop": min(start + CHUNK, comments),
+            })
+            db.commit()
+            print(f"  comments {min(start + CHUNK, comments)}/{comments}")
+        return
+
+    now = datetime.utcnow()
+    for start in range(0, comments, SQLITE_BATCH):
+        db.execute(insert(Comments), [
+            {
+                "content": f"comment {i}",
+                "created_at": now - timedelta(seconds=i),
+                "updated_at": now - timedelta(seconds=i),
+                "post_id": random.randint(first, last),
+                "user_id": user_ids[i % len(user_ids)],
+            }
+            for i in range(start, min(start + SQLITE_BATCH, comments))
+        ])
+        db.commit()
+
+
+def refresh_counters(db) -> None:
+    db.execute(text("UPDATE row_counts SET count = (SELECT COUNT(*) FROM posts) WHERE name = 'posts'"))
+    db.execute(text("UPDATE users SET posts_count = (SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id)"))
+    db.execute(text("UPDATE posts SET comments_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"))
+    db.commit()
+    if is_postgres():
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM ANALYZE"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--comments", type=int, default=1_000_000)
+    parser.add_argument("--reset", action="store_true", help="delete previously seeded rows first")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        if args.reset:
+            reset(db)
+        seed_users(db, args.users)
+        user_ids = list(db.scalars(seeded_user_ids()).all())
+        seed_posts(db, args.posts, user_ids)
+        seed_comments(db, args.comments, user_ids)
+        refresh_counters(db)
+    print(f"seeded {args.users} users, {args.posts} posts, {args.comments} comments in {time.perf_counter() - started:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
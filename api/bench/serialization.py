@@ -0,0 +1,97 @@
+"""
+Serialization CPU per GET /posts request, old path vs pre-encoded bytes.
+
+    cd api && python -m bench.serialization --items 10 --rounds 2000
+
+old miss: PostOut.model_dump -> jsonable_encoder -> json.dumps into Redis,
+          then PaginatedPosts validation + FastAPI encoding of the response
+old hit:  json.loads -> PaginatedPosts validation + FastAPI encoding
+new miss: PostOut.model_dump(mode="json") -> one orjson.dumps of the final body
+new hit:  nothing, the cached bytes are the response body
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from schemas.posts import PaginatedPosts, PostOut
+
+
+def make_rows(n: int) -> list:
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=i,
+            user_id=i % 50,
+            created_at=now - timedelta(minutes=i),
+            updated_at=now - timedelta(minutes=i),
+            title=f"post title {i}",
+            content="lorem ipsum dolor sit amet " * 20,
+            likes=i * 3,
+        )
+        for i in range(n)
+    ]
+
+
+def respond(model: PaginatedPosts) -> bytes:
+    # what FastAPI does with a response_model return value
+    validated = PaginatedPosts.model_validate(model)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def old_miss(rows, limit):
+    items = [PostOut.model_validate(p, from_attributes=True).model_dump() for p in rows]
+    cached = json.dumps(jsonable_encoder({"items": items, "total": 1000}))
+    page = PaginatedPosts(items=items, page=1, limit=limit, total=1000, has_next=True, has_prev=False)
+    return cached, respond(page)
+
+
+def old_hit(cached, limit):
+    data = json.loads(cached)
+    page = PaginatedPosts(items=data["items"], page=1, limit=limit, total=data["total"], has_next=True, has_prev=False)
+    return respond(page)
+
+
+def new_miss(rows, limit):
+    items = [PostOut.model_validate(p, from_attributes=True).model_dump(mode="json") for p in rows]
+    return orjson.dumps({
+        "items": items, "page": 1, "limit": limit, "total": 1000,
+        "has_next": True, "has_prev": False, "next_cursor": None, "prev_cursor": None,
+    })
+
+
+def new_hit(body, limit):
+    return body
+
+
+def measure(label: str, fn, rounds: int) -> None:
+    fn()
+    started = time.process_time()
+    for _ in range(rounds):
+        fn()
+    per_call = (time.process_time() - started) / rounds
+    print(f"{label:<10} {per_call * 1e6:10.1f} us CPU/request")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.items)
+    cached, _ = old_miss(rows, args.items)
+    body = new_miss(rows, args.items)
+
+    measure("old miss", lambda: old_miss(rows, args.items), args.rounds)
+    measure("old hit", lambda: old_hit(cached, args.items), args.rounds)
+    measure("new miss", lambda: new_miss(rows, args.items), args.rounds)
+    measure("new hit", lambda: new_hit(body, args.items), args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,716 @@
-import os 
-import json
-import redis
-from typings import Any, Optional
+import asyncio
+import builtins
+import fnmatch
+import math
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import msgpack
+import orjson
+import redis.asyncio as redis
+
+import metrics
 from logging_config import get_logger
 
 logger = get_logger("cache")
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis")
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "orjson")
+# how long an expired entry may still be served while one refresh runs
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "60"))
+# XFetch beta: >1 refreshes earlier, 0 disables probabilistic early refresh
+CACHE_EARLY_REFRESH_BETA = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+CACHE_LOCK_TTL_MS = int(os.getenv("CACHE_LOCK_TTL_MS", "5000"))
+CACHE_LOCK_WAIT = float(os.getenv("CACHE_LOCK_WAIT", "2.0"))
+LOCAL_CACHE_MAX_ITEMS = int(os.getenv("LOCAL_CACHE_MAX_ITEMS", "10000"))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# compare-and-delete so a worker never releases a lock it no longer owns
+_RELEASE_LOCK_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_pool: Optional[redis.ConnectionPool] = None
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """ Shared async client; every caller in the process borrows from one connection pool """
+    global _pool, _client
+    if _client is None:
+        _pool = redis.ConnectionPool.from_url(REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS)
+        _client = redis.Redis(connection_pool=_pool)
+    return _client
+
+
+async def close_redis() -> None:
+    global _pool, _client
+    if _client is not None:
+        await _client.aclose()
+        await _pool.disconnect()
+    _pool = None
+    _client = None
+
+
+def _msgpack_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value)!r}")
+
+
+def dumps(value: Any) -> bytes:
+    if CACHE_SERIALIZER == "msgpack":
+        return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    return orjson.dumps(value, default=str)
+
+
+def loads(raw: bytes) -> Any:
+    if CACHE_SERIALIZER == "msgpack":
+        return msgpack.unpackb(raw, raw=False)
+    return orjson.loads(raw)
+
+
+class RedisBackend:
+    """ Cache operations against the shared pooled Redis client """
+
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        return await get_redis().get(key)
+
+    async def set_raw(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        await get_redis().set(key, value, ex=ttl)
+
+    async def get_many_raw(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return await get_redis().mget(keys)
+
+    async def set_many_raw(self, mapping: Dict[str, bytes], ttl: Optional[int] = None) -> None:
+        if not mapping:
+            return
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await get_redis().delete(*keys)
+
+    async def incr(self, *keys: str, ttl: Optional[int] = None) -> None:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incr(key)
+                if ttl is not None:
+                    pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await get_redis().publish(channel, message)
+
+    async def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        return bool(await get_redis().set(key, token, nx=True, px=ttl_ms))
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await get_redis().eval(_RELEASE_LOCK_LUA, 1, key, token)
+
+    async def window_count(self, key: str, window_seconds: float) -> int:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, 0, time.time() - window_seconds)
+            pipe.zcard(key)
+            _, count = await pipe.execute()
+        return count
+
+    async def window_add(self, key: str, window_seconds: float) -> None:
+        now = time.time()
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {f"{now}:{uuid.uuid4().hex[:8]}": now})
+            pipe.expire(key, math.ceil(window_seconds))
+            await pipe.execute()
+
+    async def zrevrangebyscore(
+        self, key: str, max_score, min_score, num: Optional[int] = None
+    ) -> List[Tuple[bytes, float]]:
+        if num is None:
+            return await get_redis().zrevrangebyscore(key, max_score, min_score, withscores=True)
+        return await get_redis().zrevrangebyscore(key, max_score, min_score, start=0, num=num, withscores=True)
+
+    async def delete_pattern(self, pattern: str) -> None:
+        # SCAN instead of KEYS so a big keyspace never blocks the server
+        client = get_redis()
+        batch: List[bytes] = []
+        async for key in client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await client.unlink(*batch)
+                batch = []
+        if batch:
+            await client.unlink(*batch)
+
+
+class MemoryBackend:
+    """ In-process dict backend for tests and local runs without Redis """
+
+    def __init__(self) -> None:
+        self._data: Dict[str, tuple[bytes, Optional[float]]] = {}
+        # sliding windows: event timestamps per key, oldest first
+        self._windows: Dict[str, List[float]] = {}
+
+    async def get_raw(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set_raw(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+
+    async def get_many_raw(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [await self.get_raw(key) for key in keys]
+
+    async def set_many_raw(self, mapping: Dict[str, bytes], ttl: Optional[int] = None) -> None:
+        for key, value in mapping.items():
+            await self.set_raw(key, value, ttl)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+            self._windows.pop(key, None)
 
-redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+    async def incr(self, *keys: str, ttl: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        for key in keys:
+            current = await self.get_raw(key)
+            self._data[key] = (str(int(current or 0) + 1).encode(), expires_at)
 
-def get_json(key: str) -> Optional[Any]:
-    """ Get JSON data from Redis """
+    async def publish(self, channel: str, message: bytes) -> None:
+        # single process, nobody else to tell
+        pass
+
+    async def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        if await self.get_raw(key) is not None:
+            return False
+        await self.set_raw(key, token.encode(), ttl_ms / 1000)
+        return True
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if await self.get_raw(key) == token.encode():
+            self._data.pop(key, None)
+
+    async def window_count(self, key: str, window_seconds: float) -> int:
+        events = self._windows.get(key)
+        if not events:
+            return 0
+        cutoff = time.time() - window_seconds
+        while events and events[0] <= cutoff:
+            events.pop(0)
+        if not events:
+            del self._windows[key]
+        return len(events)
+
+    async def window_add(self, key: str, window_seconds: float) -> None:
+        self._windows.setdefault(key, []).append(time.time())
+
+    async def zrevrangebyscore(
+        self, key: str, max_score, min_score, num: Optional[int] = None
+    ) -> List[Tuple[bytes, float]]:
+        # sorted sets (timelines) are written by the Celery workers straight to Redis
+        return []
+
+    async def delete_pattern(self, pattern: str) -> None:
+        for key in fnmatch.filter(list(self._data), pattern):
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._windows.clear()
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU with per-entry TTL, the tier in front of Redis.
+    Bounded by both entry count and (serialized) bytes; evicts least recently used.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        (hit, value) so that a cached None is distinguishable from a miss.
+        Callers record hits and misses with metrics.cache_lookup, per key namespace.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, size: int, ttl: float) -> None:
+        if size > self.max_bytes or ttl <= 0:
+            return
+        self._drop(key)
+        self._entries[key] = (value, size, time.monotonic() + ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_items or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            metrics.LOCAL_CACHE_EVICTIONS.inc()
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._drop(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """ Size of the tier, exported as gauges on every /metrics scrape """
+        return {"items": len(self._entries), "bytes": self._bytes}
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+_backend = MemoryBackend() if CACHE_BACKEND == "memory" else RedisBackend()
+local = LocalCache(LOCAL_CACHE_MAX_ITEMS, LOCAL_CACHE_MAX_BYTES)
+_listener_task: Optional["asyncio.Task[None]"] = None
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """ Swap the backend, e.g. MemoryBackend() in tests """
+    global _backend
+    _backend = backend
+
+
+async def get(key: str) -> Optional[Any]:
+    """ Get a deserialized value, None on miss or cache error """
     try:
-        raw = redis_client.get(key)
+        raw = await _backend.get_raw(key)
         if raw is None:
             return None
-        return json.loads(raw)
+        return loads(raw)
     except Exception as e:
-        logger.error(f"Error getting JSON data from Redis: {e}")
+        logger.error("Error getting %s from cache: %s", key, e)
         return None
 
-def set_josn(key: str, value: Any, ttl: Optional[int] = None) -> None:
-    """ Set JSON data in Redis """
+
+async def set(key: str, value: Any, ttl: Optional[int] = None) -> None:
+    """ Serialize and store a value """
+    try:
+        await _backend.set_raw(key, dumps(value), ttl)
+    except Exception as e:
+        logger.error("Error setting %s in cache: %s", key, e)
+
+
+async def get_many(keys: Iterable[str]) -> List[Optional[Any]]:
+    """ Multi-get in one round trip, misses come back as None """
+    keys = list(keys)
+    try:
+        raws = await _backend.get_many_raw(keys)
+        return [loads(raw) if raw is not None else None for raw in raws]
+    except Exception as e:
+        logger.error("Error getting %d keys from cache: %s", len(keys), e)
+        return [None] * len(keys)
+
+
+async def set_many(mapping: Dict[str, Any], ttl: Optional[int] = None) -> None:
+    """ Multi-set through one pipeline """
+    try:
+        await _backend.set_many_raw({k: dumps(v) for k, v in mapping.items()}, ttl)
+    except Exception as e:
+        logger.error("Error setting %d keys in cache: %s", len(mapping), e)
+
+
+async def delete_key(*keys: str) -> None:
+    """ Delete keys from the cache """
+    try:
+        await _backend.delete(*keys)
+    except Exception as e:
+        logger.error("Error deleting keys from cache: %s", e)
+
+
+async def get_counters(keys: Iterable[str], *, local_ttl: Optional[float] = None) -> List[int]:
+    """
+    Read integer counters written by incr, 0 for missing keys or on error.
+    With local_ttl the values are also kept in the in-process tier; writers must
+    then call broadcast_eviction after incr.
+    """
+    keys = list(keys)
+    if local_ttl:
+        found = [local.get(key) for key in keys]
+        hits = sum(hit for hit, _ in found)
+        if keys:
+            metrics.cache_lookup(keys[0], "local", "hit", hits)
+            metrics.cache_lookup(keys[0], "local", "miss", len(keys) - hits)
+        if hits == len(keys):
+            return [value for _, value in found]
+    try:
+        raws = await _backend.get_many_raw(keys)
+    except Exception as e:
+        logger.error("Error reading counters from cache: %s", e)
+        return [0] * len(keys)
+
+    counters = [int(raw) if raw is not None else 0 for raw in raws]
+    if local_ttl:
+        for key, value in zip(keys, counters):
+            local.set(key, value, 8, local_ttl)
+    return counters
+
+
+async def incr(*keys: str, ttl: Optional[int] = None) -> None:
+    """ Atomically increment counters, pipelined; ttl (re)arms their expiry """
+    try:
+        await _backend.incr(*keys, ttl=ttl)
+    except Exception as e:
+        logger.error("Error incrementing counters in cache: %s", e)
+
+
+async def zrevrangebyscore(key: str, max_score, min_score, num: Optional[int] = None) -> List[Tuple[bytes, float]]:
+    """ Sorted set members with scores, highest first; empty on cache error """
+    try:
+        return await _backend.zrevrangebyscore(key, max_score, min_score, num)
+    except Exception as e:
+        logger.error("Error reading sorted set %s from cache: %s", key, e)
+        return []
+
+
+async def invalidate(*keys: str) -> None:
+    """ Delete keys from Redis and from the local tier of every worker """
+    await delete_key(*keys)
+    await broadcast_eviction(*keys)
+
+
+async def broadcast_eviction(*keys: str) -> None:
+    """ Drop keys from the local tier here and, via pub/sub, in every other worker """
+    local.delete(*keys)
     try:
-        data = json.dumps(value, default=str)
-        if ttl is not None:
-            redis_client.setex(key, ttl, data)
+        await _backend.publish(INVALIDATION_CHANNEL, orjson.dumps(keys))
+    except Exception as e:
+        logger.error("Error publishing cache invalidation: %s", e)
+
+
+async def start_invalidation_listener() -> None:
+    """ Subscribe this worker to local-tier invalidations, call once on startup """
+    global _listener_task
+    if _listener_task is None and isinstance(_backend, RedisBackend):
+        _listener_task = asyncio.get_running_loop().create_task(_listen_for_invalidations())
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+
+
+async def _listen_for_invalidations() -> None:
+    while True:
+        pubsub = get_redis().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    local.delete(*orjson.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # messages may have been missed while disconnected, start from a clean tier
+            logger.error("Cache invalidation listener failed, resubscribing: %s", e)
+            local.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+async def delete_pattern(pattern: str) -> None:
+    """ Delete keys by pattern """
+    try:
+        await _backend.delete_pattern(pattern)
+    except Exception as e:
+        logger.error("Error deleting keys by pattern %s from cache: %s", pattern, e)
+
+
+# ---- stampede protection ---------------------------------------------------
+#
+# get_or_compute stores {"v": value, "exp": logical expiry, "d": compute seconds}
+# (see _pack_entry for the wire format)
+# under a physical TTL of ttl + stale_ttl. Concurrent misses in one process share
+# a single future, across workers they queue behind a Redis lock. Fresh entries
+# are refreshed early with probability rising towards expiry (XFetch), and stale
+# entries are served while one background task repopulates them; both only when
+# the caller supplies a `refresh` that does not need the request's resources.
+
+_inflight: Dict[str, "asyncio.Future[Any]"] = {}
+# the module's own set() (store a value) shadows the builtin here
+_refreshing: Set[str] = builtins.set()
+_background_tasks: Set["asyncio.Task[None]"] = builtins.set()
+
+
+async def get_or_compute(
+    key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl: int,
+    *,
+    refresh: Optional[Callable[[], Awaitable[Any]]] = None,
+    stale_ttl: int = CACHE_STALE_TTL,
+    beta: float = CACHE_EARLY_REFRESH_BETA,
+    local_ttl: Optional[float] = None,
+) -> Any:
+    """
+    Return the cached value for key, computing it at most once per key across
+    concurrent callers. `refresh` runs in the background after the request has
+    finished, so it must not depend on request-scoped resources. Without it
+    (or with stale_ttl=0) nothing is refreshed in the background: expired
+    entries are treated as misses and recomputed inline with `compute`. With
+    local_ttl, fresh values are also served from the in-process tier without
+    touching Redis.
+    """
+    if local_ttl:
+        hit, value = local.get(key)
+        if hit:
+            metrics.cache_lookup(key, "local", "hit")
+            return value
+        metrics.cache_lookup(key, "local", "miss")
+
+    entry, size = await _get_entry(key)
+    now = time.time()
+    if entry is not None and now >= entry["exp"] and (refresh is None or stale_ttl <= 0):
+        # the physical TTL outlives "exp" by the SET round trip; without a
+        # request-independent refresh there is no one to serve stale for
+        entry = None
+
+    if entry is not None:
+        expires_at = entry["exp"]
+        if now >= expires_at:
+            metrics.cache_lookup(key, "redis", "stale")
+            _schedule_refresh(key, refresh, ttl, stale_ttl)
         else:
-            redis_client.set(key, data)
+            metrics.cache_lookup(key, "redis", "hit")
+            if refresh is not None and beta > 0 and now - entry["d"] * beta * math.log(1.0 - random.random()) >= expires_at:
+                _schedule_refresh(key, refresh, ttl, stale_ttl)
+            if local_ttl:
+                local.set(key, entry["v"], size, min(local_ttl, expires_at - now))
+        return entry["v"]
+
+    metrics.cache_lookup(key, "redis", "miss")
+    value = await _single_flight(key, compute, ttl, stale_ttl)
+    if local_ttl:
+        size = len(value) if isinstance(value, bytes) else len(dumps(value))
+        local.set(key, value, size, min(local_ttl, ttl))
+    return value
+
+
+def _pack_entry(entry: dict) -> bytes:
+    """
+    Byte values (pre-encoded response bodies) are stored verbatim after a small
+    JSON header, so hits hand them back without any decode or re-encode.
+    """
+    value = entry["v"]
+    if isinstance(value, bytes):
+        header = orjson.dumps({"exp": entry["exp"], "d": entry["d"]})
+        return b"B" + header + b"\n" + value
+    return b"V" + dumps(entry)
+
+
+def _unpack_entry(raw: bytes) -> dict:
+    if raw[:1] == b"B":
+        # orjson never emits a raw newline, so the first one ends the header
+        header, _, value = raw[1:].partition(b"\n")
+        entry = orjson.loads(header)
+        entry["v"] = value
+        return entry
+    return loads(raw[1:])
+
+
+async def get_values(keys: List[str], *, local_ttl: Optional[float] = None) -> List[Optional[Any]]:
+    """
+    Multi-get of values written by get_or_compute / set_values in one MGET,
+    local tier first. Misses come back as None; nothing is computed or refreshed.
+    """
+    results: List[Optional[Any]] = [None] * len(keys)
+    remote = []
+    for i, key in enumerate(keys):
+        if local_ttl:
+            hit, value = local.get(key)
+            if hit:
+                results[i] = value
+                continue
+        remote.append(i)
+    if keys and local_ttl:
+        metrics.cache_lookup(keys[0], "local", "hit", len(keys) - len(remote))
+        metrics.cache_lookup(keys[0], "local", "miss", len(remote))
+    if not remote:
+        return results
+
+    try:
+        raws = await _backend.get_many_raw([keys[i] for i in remote])
+    except Exception as e:
+        logger.error("Error getting %d keys from cache: %s", len(remote), e)
+        return results
+
+    hits = sum(raw is not None for raw in raws)
+    metrics.cache_lookup(keys[0], "redis", "hit", hits)
+    metrics.cache_lookup(keys[0], "redis", "miss", len(raws) - hits)
+
+    now = time.time()
+    for i, raw in zip(remote, raws):
+        if raw is None:
+            continue
+        entry = _unpack_entry(raw)
+        results[i] = entry["v"]
+        if local_ttl and now < entry["exp"]:
+            local.set(keys[i], entry["v"], len(raw), min(local_ttl, entry["exp"] - now))
+    return results
+
+
+async def set_values(mapping: Dict[str, Any], ttl: int, *, stale_ttl: int = CACHE_STALE_TTL) -> None:
+    """ Multi-set in the get_or_compute format, through one pipeline """
+    if not mapping:
+        return
+    now = time.time()
+    packed = {key: _pack_entry({"v": value, "exp": now + ttl, "d": 0.0}) for key, value in mapping.items()}
+    try:
+        await _backend.set_many_raw(packed, ttl + stale_ttl)
+    except Exception as e:
+        logger.error("Error setting %d keys in cache: %s", len(mapping), e)
+
+
+async def _get_entry(key: str) -> Tuple[Optional[dict], int]:
+    try:
+        raw = await _backend.get_raw(key)
+        if raw is None:
+            return None, 0
+        return _unpack_entry(raw), len(raw)
+    except Exception as e:
+        logger.error("Error getting %s from cache: %s", key, e)
+        return None, 0
+
+
+async def _single_flight(key: str, compute, ttl: int, stale_ttl: int) -> Any:
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await _compute_with_lock(key, compute, ttl, stale_ttl)
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it, silence "never retrieved"
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _compute_with_lock(key: str, compute, ttl: int, stale_ttl: int) -> Any:
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+
+    if await _try_lock(lock_key, token):
+        try:
+            return await _store(key, compute, ttl, stale_ttl)
+        finally:
+            await _unlock(lock_key, token)
+
+    # another worker holds the lock, wait for its value before giving up and computing
+    deadline = time.monotonic() + CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        entry, _ = await _get_entry(key)
+        if entry is not None:
+            return entry["v"]
+    return await _store(key, compute, ttl, stale_ttl)
+
+
+async def _store(key: str, compute, ttl: int, stale_ttl: int) -> Any:
+    started = time.monotonic()
+    value = await compute()
+    delta = time.monotonic() - started
+    entry = {"v": value, "exp": time.time() + ttl, "d": delta}
+    try:
+        await _backend.set_raw(key, _pack_entry(entry), ttl + stale_ttl)
     except Exception as e:
-        logger.error(f"Error setting JSON data in Redis: {e}")
+        logger.error("Error setting %s in cache: %s", key, e)
+    return value
+
+
+def _schedule_refresh(key: str, refresh, ttl: int, stale_ttl: int) -> None:
+    if key in _refreshing or key in _inflight:
+        return
+    _refreshing.add(key)
+    task = asyncio.get_running_loop().create_task(_background_refresh(key, refresh, ttl, stale_ttl))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _background_refresh(key: str, refresh, ttl: int, stale_ttl: int) -> None:
+    lock_key = f"lock:{key}"
+    token = uuid.uuid4().hex
+    try:
+        # a worker that loses the race just keeps serving what is cached
+        if not await _try_lock(lock_key, token):
+            return
+        try:
+            await _store(key, refresh, ttl, stale_ttl)
+        finally:
+            await _unlock(lock_key, token)
+    except Exception as e:
+        logger.error("Background refresh of %s failed: %s", key, e)
+    finally:
+        _refreshing.discard(key)
+
 
-def delete_key(key: str) -> None:
-    """ Delete key from Redis """
+async def _try_lock(lock_key: str, token: str) -> bool:
     try:
-        redis_client.delete(key)
+        return await _backend.acquire_lock(lock_key, token, CACHE_LOCK_TTL_MS)
     except Exception as e:
-        logger.error(f"Error deleting key from Redis: {e}")
+        # without Redis there is nothing to coordinate, in-process single flight still applies
+        logger.error("Error acquiring cache lock %s: %s", lock_key, e)
+        return True
 
 
-def delete_pattern(pattern: str) -> None:
-    """ Delete keys by pattern from Redis """
+async def _unlock(lock_key: str, token: str) -> None:
     try:
-        for k in redis_client.key(pattern):
-            redis_client.delete(k)
+        await _backend.release_lock(lock_key, token)
     except Exception as e:
-        logger.error(f"Error deleting keys by pattern from Redis: {e}")
\ No newline at end of file
+        logger.error("Error releasing cache lock %s: %s", lock_key, e)
@@ -1,5 +1,10 @@
 import os
+
+import redis
 from celery import Celery
+from celery.signals import worker_process_init
+
+from logging_config import setup_logging
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
@@ -7,13 +12,30 @@ celery_app = Celery(
     "microblog",
     broker=REDIS_URL,
     bakend=REDIS_URL,
-    include=["tasks.notifications"]
+    include=["tasks.notifications", "tasks.likes", "tasks.feed"]
 )
 
+# one sync client (and connection pool) per worker process, shared by every task module
+redis_client = redis.Redis.from_url(REDIS_URL)
+
+LIKES_FLUSH_INTERVAL = float(os.getenv("LIKES_FLUSH_INTERVAL", "5"))
+
 celery_app.conf.update(
     task_serializer="json",
     result_serializer="json",
     accept_content=["json"],
     timezone="Asia/Kolkata",
     enable_utc=True,
-)
\ No newline at end of file
+    beat_schedule={
+        "flush-post-likes": {
+            "task": "tasks.likes.flush_post_likes",
+            "schedule": LIKES_FLUSH_INTERVAL,
+        },
+    },
+)
+
+
+@worker_process_init.connect
+def _init_worker_logging(**kwargs):
+    # the queue listener thread does not survive the prefork, start one per child
+    setup_logging()
@@ -1,10 +1,56 @@
 import os
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+import metrics
+import query_profiler
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, echo=False)
+# pool sizing is per worker process; tune with the number of uvicorn/celery workers in mind
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "30"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+def _async_url(url: str | None) -> str | None:
+    """Map the sync DATABASE_URL onto its async driver (asyncpg / aiosqlite)."""
+    if url is None:
+        return None
+    for sync_prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(sync_prefix):
+            return "postgresql+asyncpg://" + url[len(sync_prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def _pool_options(url: str | None, poolclass: type) -> dict:
+    # sqlite uses a single-connection pool that rejects these options
+    if url is None or url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# sync engine: celery tasks, alembic and scripts
+engine = create_engine(
+    DATABASE_URL, echo=False, **_pool_options(DATABASE_URL, metrics.timed_pool(QueuePool, "sync"))
+)
+metrics.instrument_engine(engine, "sync")
+query_profiler.install(engine)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -12,6 +58,22 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# async engine: every request handler
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **_pool_options(ASYNC_DATABASE_URL, metrics.timed_pool(AsyncAdaptedQueuePool, "async")),
+)
+metrics.instrument_engine(async_engine.sync_engine, "async")
+query_profiler.install(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 class Base(DeclarativeBase):
     pass
 
@@ -22,7 +84,11 @@ def get_db():
     finally:
         db.close()
 
-def check_db_connection():
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def check_db_connection():
     """Simple SELECT 1 to confirm DB is alive."""
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
\ No newline at end of file
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
@@ -0,0 +1,102 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Sequence
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from database import AsyncSessionLocal
+
+# rows fetched per server-side cursor round trip, and encoded per response chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """ Timestamp columns are naive UTC, so aware filter values are converted first """
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def stream_rows(stmt: Select) -> AsyncIterator[List[dict]]:
+    """
+    Run the query on a server-side cursor and yield it in partitions of
+    EXPORT_BATCH_SIZE rows, so memory stays flat however large the table is.
+    The session is opened here, not taken from the request, because it has to
+    outlive the handler for as long as the response is streaming.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.mappings().partitions(EXPORT_BATCH_SIZE):
+            yield partition
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def encode_ndjson(partitions: AsyncIterator[Sequence[dict]]) -> AsyncIterator[bytes]:
+    async for rows in partitions:
+        yield b"".join(orjson.dumps(dict(row)) + b"\n" for row in rows)
+
+
+async def encode_csv(partitions: AsyncIterator[Sequence[dict]], fields: Sequence[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for rows in partitions:
+        writer.writerows([_csv_value(row[field]) for field in fields] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(request: Request) -> bool:
+    return any(
+        part.split(";")[0].strip() == "gzip"
+        for part in request.headers.get("accept-encoding", "").split(",")
+    )
+
+
+def export_response(
+    request: Request,
+    stmt: Select,
+    *,
+    fields: Sequence[str],
+    fmt: str,
+    filename: str,
+) -> StreamingResponse:
+    """ Stream the query as NDJSON or CSV, gzipped on the fly when the client accepts it """
+    partitions = stream_rows(stmt)
+    body = encode_csv(partitions, fields) if fmt == "csv" else encode_ndjson(partitions)
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{fmt}"',
+        "Vary": "Accept-Encoding",
+    }
+    if accepts_gzip(request):
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -1,12 +1,36 @@
+import atexit
 import logging
+import os
+import queue
+import random
 import sys
-import uuid
-from contextvars import ContextVar
+import time
+from contextvars import ContextVar, Token
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import orjson
 
 _request_id_ctx: ContextVar[str | None] = ContextVar("request_id", default=None)
 
-def set_request_id(request_id: str) -> None:
-    _request_id_ctx.set(request_id)
+# json for Promtail/Loki, text for reading a local terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# per-logger overrides, e.g. LOG_LEVELS="cache=WARNING,middleware.request_id=INFO"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# keep only a fraction of INFO/DEBUG records per logger, e.g. LOG_SAMPLING="search=0.1"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+
+# attributes every LogRecord has; anything else on a record came from extra={...}
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+def set_request_id(request_id: str) -> Token:
+    return _request_id_ctx.set(request_id)
+
+def reset_request_id(token: Token) -> None:
+    _request_id_ctx.reset(token)
 
 def get_request_id() -> str | None:
     return _request_id_ctx.get()
@@ -18,31 +42,128 @@ class RequestIdFilter(logging.Filter):
         record.request_id = get_request_id() or "-"
         return True
 
+class SamplingFilter(logging.Filter):
+    """
+    Drops a share of INFO/DEBUG records for the configured loggers (matched by
+    the longest dotted prefix). WARNING and above always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return random.random() < rate
+            name = name.rpartition(".")[0]
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including every extra={...} field"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+class TextFormatter(logging.Formatter):
+    """The original pipe-separated layout, with extra fields appended as key=value"""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s | level=%(levelname)s | logger=%(name)s | request_id=%(request_id)s | %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = " ".join(
+            f"{key}={value}" for key, value in record.__dict__.items()
+            if key not in _RESERVED and not key.startswith("_")
+        )
+        return f"{line} | {extras}" if extras else line
+
+class _QueueHandler(QueueHandler):
+    """
+    Runs in the logging thread: interpolates the message (only for records
+    that passed the level checks) and renders the traceback, so the record
+    is safe to hand to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in spec.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip():
+            pairs[f"microblog.{name.strip()}"] = value.strip()
+    return pairs
+
 def setup_logging() -> None:
     """
-    Configure a dedicated 'microblog' logger with structured-ish output.
+    Configure a dedicated 'microblog' logger.
     Call this once in main.py.
+    Records are queued by the calling thread and written to stdout by a
+    QueueListener thread, so a slow stdout never blocks the event loop.
     """
+    global _listener
+
     logger = logging.getLogger("microblog")
-    logger.setLevel(logging.INFO)
+    logger.setLevel(LOG_LEVEL)
     logger.propagate = False
 
     if logger.handlers:
         return
 
-    handler = logging.StreamHandler(sys.stdout)
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
 
-    formatter = logging.Formatter(
-        "%(asctime)s | level=%(levelname)s | logger=%(name)s | request_id=%(request_id)s | %(message)s"
-    )
-    handler.setFormatter(formatter)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    # filters run in the caller: the request id ContextVar is only visible there
     handler.addFilter(RequestIdFilter())
+    rates = {name: float(rate) for name, rate in _parse_pairs(LOG_SAMPLING).items()}
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
 
     logger.addHandler(handler)
 
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """ Flush queued records and stop the writer thread """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def get_logger(name: str | None = None) -> logging.Logger:
     if name:
         return logging.getLogger(f"microblog.{name}")
     return logging.getLogger("microblog")
- 
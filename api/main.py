@@ -1,14 +1,17 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.exceptions import HTTPException
 from fastapi.responses import JSONResponse
 from middleware.request_id import RequestIdMiddleware
-from logging_config import get_logger, setup_logging
-from database import check_db_connection
-from routers import posts, users, comments
+from middleware.query_profiler import QueryProfilerMiddleware
+from logging_config import get_logger, setup_logging, shutdown_logging
+from database import async_engine, check_db_connection
+from routers import posts, users, comments, feed
 from fastapi.middleware.cors import CORSMiddleware
 from errors import ErrorPayload, AppError
 from fastapi_limiter import FastAPILimiter
-import redis.asyncio as redis
+from auth import shutdown_password_pool
+from cache import close_redis, get_redis, local as local_cache, start_invalidation_listener, stop_invalidation_listener
+import metrics
 
 import os
 
@@ -22,6 +25,8 @@ origins = [
     "http://127.0.0.1:3000",
 ]
 
+# inner to RequestIdMiddleware, so its log lines carry the request id
+app.add_middleware(QueryProfilerMiddleware)
 app.add_middleware(RequestIdMiddleware)
 
 app.add_middleware(
@@ -35,17 +40,22 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up rate limiter")
-    r = redis.from_url("redis://redis:6379", encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    await FastAPILimiter.init(get_redis())
     logger.info("Rate limiter initialized")
+    await start_invalidation_listener()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down rate limiter")
+    await stop_invalidation_listener()
+    await async_engine.dispose()
+    await close_redis()
+    shutdown_password_pool()
+    shutdown_logging()
 
 @app.exception_handler(AppError)
 async def app_error_handler(request: Request, exc: AppError):
-    logger.warning(f"App error at {request.url}: {exc.code} - {exc.message}")
+    logger.warning("App error at %s: %s - %s", request.url.path, exc.code, exc.message, extra={"event": "APP_ERROR", "code": exc.code, "status_code": exc.status_code})
 
     payload = ErrorPayload(
         code = exc.code,
@@ -62,14 +72,22 @@ async def app_error_handler(request: Request, exc: AppError):
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    await metrics.update_queue_lengths(get_redis())
+    metrics.update_local_cache(local_cache.stats())
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/db-health")
-def db_health():
+async def db_health():
     try:
-        check_db_connection()
+        await check_db_connection()
         return {"status": "ok", "db": "connected"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB error: {e}")
 
 app.include_router(posts.router)
 app.include_router(users.router)
-app.include_router(comments.router)
\ No newline at end of file
+app.include_router(comments.router)
+app.include_router(feed.router)
\ No newline at end of file
@@ -0,0 +1,173 @@
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import Scope
+
+from logging_config import get_logger
+
+logger = get_logger("metrics")
+
+# set (to an empty, writable directory) when running several uvicorn workers,
+# so /metrics aggregates every process instead of whichever one answered
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+CELERY_QUEUES = [q for q in os.getenv("METRICS_CELERY_QUEUES", "celery").split(",") if q]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection (includes opening overflow connections)",
+    ["engine"],
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Statement execution time by operation",
+    ["engine", "operation"],
+    buckets=FAST_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by key namespace, tier and result",
+    ["namespace", "tier", "result"],
+)
+LOCAL_CACHE_EVICTIONS = Counter(
+    "cache_local_evictions_total",
+    "Entries pushed out of the in-process cache tier by its size bounds",
+)
+LOCAL_CACHE_ITEMS = Gauge(
+    "cache_local_items",
+    "Entries held in the in-process cache tier",
+    multiprocess_mode="livesum",
+)
+LOCAL_CACHE_BYTES = Gauge(
+    "cache_local_bytes",
+    "Serialized size of the entries held in the in-process cache tier",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash/verify time, queueing in the password pool included",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_JOBS_PENDING = Gauge(
+    "password_jobs_pending",
+    "bcrypt jobs queued or running",
+    multiprocess_mode="livesum",
+)
+PASSWORD_JOBS_REJECTED = Counter(
+    "password_jobs_rejected_total",
+    "bcrypt jobs refused by admission control",
+)
+CELERY_QUEUE_LENGTH = Gauge(
+    "celery_queue_length",
+    "Messages waiting in a Celery broker queue",
+    ["queue"],
+    multiprocess_mode="mostrecent",
+)
+
+_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+
+def observe_request(scope: Scope, status_code: int, seconds: float) -> None:
+    # the matched route's template keeps label cardinality bounded
+    route = getattr(scope.get("route"), "path", None) or "unmatched"
+    HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status_code)).observe(seconds)
+
+
+def cache_lookup(key: str, tier: str, result: str, count: int = 1) -> None:
+    if count:
+        CACHE_REQUESTS.labels(key.partition(":")[0], tier, result).inc(count)
+
+
+def timed_pool(base: type, engine_name: str) -> type:
+    """
+    Subclass of a SQLAlchemy pool class that times every checkout. There is no
+    pool event that fires before a checkout starts waiting, so _do_get is wrapped.
+    """
+    histogram = DB_POOL_WAIT_SECONDS.labels(engine_name)
+
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def instrument_engine(engine: Engine, engine_name: str) -> None:
+    """ Statement timings and checked-out connections; pass async_engine.sync_engine for async engines """
+    checked_out = DB_POOL_CHECKED_OUT.labels(engine_name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip()[:6].upper()
+        if operation not in _OPERATIONS:
+            operation = "OTHER"
+        DB_QUERY_SECONDS.labels(engine_name, operation).observe(time.perf_counter() - context._metrics_start)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        checked_out.dec()
+
+
+def update_local_cache(stats: dict) -> None:
+    LOCAL_CACHE_ITEMS.set(stats["items"])
+    LOCAL_CACHE_BYTES.set(stats["bytes"])
+
+
+async def update_queue_lengths(redis_client) -> None:
+    """ Celery's Redis broker keeps each queue as a list named after it """
+    try:
+        for queue_name in CELERY_QUEUES:
+            CELERY_QUEUE_LENGTH.labels(queue_name).set(await redis_client.llen(queue_name))
+    except Exception as e:
+        logger.error("Error reading Celery queue lengths: %s", e)
+
+
+def render() -> Tuple[bytes, str]:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,33 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import query_profiler
+
+
+class QueryProfilerMiddleware:
+    """
+    Collects the statements each request issues (count, DB time, repeated
+    shapes) and, when SERVER_TIMING is on, reports them in a Server-Timing
+    header. Add it inside RequestIdMiddleware so its log lines carry the request id.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = query_profiler.SERVER_TIMING) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = query_profiler.start_request()
+
+        async def send_with_timing(message: Message) -> None:
+            if self.server_timing and message["type"] == "http.response.start":
+                header = (b"server-timing", query_profiler.server_timing(stats))
+                message = {**message, "headers": [*message.get("headers", ()), header]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_profiler.finish_request(stats, token, scope["method"], scope["path"])
@@ -1,35 +1,91 @@
+import logging
+import os
+import random
+import time
 import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp, Receive, Scope, Send
 
-from logging_config import set_request_id, get_logger
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+from logging_config import get_logger, reset_request_id, set_request_id
 
 logger = get_logger("middleware.request_id")
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
+REQUEST_ID_HEADER = b"x-request-id"
+# incoming ids are echoed back, so keep them to a sane size
+MAX_REQUEST_ID_LENGTH = 128
+
+# fraction of successful, fast requests that get an access log line;
+# errors and slow requests are always logged
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+
+
+class RequestIdMiddleware:
     """
-    - Reads X-Request-Id from the incoming request if present
-    - Otherwise generates a new UUID
+    Plain ASGI middleware, so responses (streaming ones included) pass through
+    untouched instead of being re-wrapped like with BaseHTTPMiddleware.
+    - Reads X-Request-Id from the incoming request if present, otherwise generates one
     - Stores it in a ContextVar so all logs in this request can use it
-    - Adds it back to the response headers
+    - Adds it to the response headers in http.response.start
+    - Times the request and writes one (sampled) access log line
     """
 
-    async def dispatch(self, request, call_next):
-        # 1) Get or generate request_id
-        incoming = request.headers.get("x-request-id")
-        request_id = incoming or str(uuid.uuid4())
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = ACCESS_LOG_SAMPLE_RATE,
+        slow_ms: float = ACCESS_LOG_SLOW_MS,
+    ) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
 
-        # 2) Store in ContextVar (used by logging filter)
-        set_request_id(request_id)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        logger.info(f"➡️ Incoming request {request.method} {request.url.path}")
+        raw_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                raw_id = value[:MAX_REQUEST_ID_LENGTH]
+                break
+        if not raw_id:
+            raw_id = uuid.uuid4().hex.encode()
+        request_id = raw_id.decode("latin-1")
 
-        # 3) Call route handler
-        response = await call_next(request)
+        token = set_request_id(request_id)
+        scope.setdefault("state", {})["request_id"] = request_id
+        start = time.perf_counter()
+        status_code = 500
 
-        # 4) Add it to response so clients can see / propagate it
-        response.headers["x-request-id"] = request_id
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", ()), (REQUEST_ID_HEADER, raw_id)]}
+            await send(message)
 
-        logger.info(f"⬅️ Completed request {request.method} {request.url.path} with status {response.status_code}")
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            scope["state"]["duration_ms"] = duration_ms
+            metrics.observe_request(scope, status_code, duration_ms / 1000)
+            self._access_log(scope, status_code, duration_ms)
+            reset_request_id(token)
 
-        return response
\ No newline at end of file
+    def _access_log(self, scope: Scope, status_code: int, duration_ms: float) -> None:
+        slow = duration_ms >= self.slow_ms
+        if status_code < 500 and not slow and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return
+        logger.log(
+            logging.WARNING if status_code >= 500 or slow else logging.INFO,
+            "%s %s %d %.1fms",
+            scope["method"],
+            scope["path"],
+            status_code,
+            duration_ms,
+            extra={"event": "ACCESS", "status_code": status_code, "duration_ms": round(duration_ms, 1)},
+        )
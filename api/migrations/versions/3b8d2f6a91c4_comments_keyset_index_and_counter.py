@@ -0,0 +1,42 @@
+"""comments keyset index and comment counter
+
+Revision ID: 3b8d2f6a91c4
+Revises: 9596f33e5167
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8d2f6a91c4'
+down_revision: Union[str, None] = '9596f33e5167'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE posts SET comments_count = c.total
+        FROM (SELECT post_id, COUNT(*) AS total FROM comments GROUP BY post_id) AS c
+        WHERE posts.id = c.post_id
+        """
+    )
+    # one direction for every column: ORDER BY created_at DESC, id DESC and the
+    # (created_at, id) < (:v, :id) seek are served by a backward scan
+    op.create_index(
+        'ix_comments_post_id_created_at_id',
+        'comments',
+        ['post_id', 'created_at', 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_post_id_created_at_id', table_name='comments')
+    op.drop_column('posts', 'comments_count')
@@ -0,0 +1,48 @@
+"""posts full text search
+
+Revision ID: a4e7c1d9b053
+Revises: 3b8d2f6a91c4
+Create Date: 2026-10-18 11:04:09.227614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e7c1d9b053'
+down_revision: Union[str, None] = '3b8d2f6a91c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # title is weighted above content so ts_rank_cd favours title hits
+    op.execute(
+        """
+        ALTER TABLE posts ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(content, '')), 'B')
+        ) STORED
+        """
+    )
+    op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_posts_title_trgm', 'posts', ['title'],
+        postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_posts_content_trgm', 'posts', ['content'],
+        postgresql_using='gin', postgresql_ops={'content': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_content_trgm', table_name='posts')
+    op.drop_index('ix_posts_title_trgm', table_name='posts')
+    op.drop_index('ix_posts_search_vector', table_name='posts')
+    op.drop_column('posts', 'search_vector')
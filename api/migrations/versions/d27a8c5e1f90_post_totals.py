@@ -0,0 +1,41 @@
+"""post totals counters
+
+Revision ID: d27a8c5e1f90
+Revises: c91f0e27d4b8
+Create Date: 2026-10-18 16:02:11.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd27a8c5e1f90'
+down_revision: Union[str, None] = 'c91f0e27d4b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('row_counts',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute("INSERT INTO row_counts (name, count) SELECT 'posts', COUNT(*) FROM posts")
+
+    op.add_column('users', sa.Column('posts_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE users SET posts_count = p.total
+        FROM (SELECT user_id, COUNT(*) AS total FROM posts WHERE user_id IS NOT NULL GROUP BY user_id) AS p
+        WHERE users.id = p.user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'posts_count')
+    op.drop_table('row_counts')
@@ -0,0 +1,67 @@
+"""index audit for listing, feed and export queries
+
+Revision ID: e5b3a9c17d42
+Revises: d27a8c5e1f90
+Create Date: 2026-10-18 16:48:37.902215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b3a9c17d42'
+down_revision: Union[str, None] = 'd27a8c5e1f90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every index column shares one direction: the keyset queries order by
+# (col, id) both ASC or both DESC, which a uniform index serves with a forward
+# or backward scan, including the row comparison (col, id) < (:v, :id).
+NEW_INDEXES = [
+    # GET /posts sorted by created_at, keyset and offset; exports by created_at range
+    ('ix_posts_created_at_id', 'posts', ['created_at', 'id']),
+    # author filtered listings, per-author timeline backfill and feed pulls
+    ('ix_posts_user_id_created_at_id', 'posts', ['user_id', 'created_at', 'id']),
+    # GET /posts?sort_by=title, offset and keyset; titles are capped below
+    ('ix_posts_title_id', 'posts', ['title', 'id']),
+]
+
+TITLE_MAX_LENGTH = 200
+
+# duplicates of the primary key
+REDUNDANT_INDEXES = [
+    ('ix_posts_id', 'posts', ['id']),
+    ('ix_users_id', 'users', ['id']),
+    ('ix_comments_id', 'comments', ['id']),
+]
+
+
+def upgrade() -> None:
+    # bound titles before indexing them; longer ones predate the API limit
+    op.execute(f"UPDATE posts SET title = left(title, {TITLE_MAX_LENGTH}) WHERE length(title) > {TITLE_MAX_LENGTH}")
+    op.create_check_constraint('ck_posts_title_length', 'posts', f"length(title) <= {TITLE_MAX_LENGTH}")
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in NEW_INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+        for name, table, _ in REDUNDANT_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    op.execute("ANALYZE posts")
+    op.execute("ANALYZE comments")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in REDUNDANT_INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+        for name, table, _ in reversed(NEW_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    op.drop_constraint('ck_posts_title_length', 'posts', type_='check')
@@ -3,27 +3,34 @@ from typing import List, Optional
 from datetime import datetime
 from database import Base
 
-from sqlalchemy import (Integer, String, Text, DateTime, ForeignKey, Boolean)
+from sqlalchemy import (BigInteger, CheckConstraint, Integer, String, Text, DateTime, ForeignKey, Boolean, Index)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
 class User(Base):
     __tablename__ = "users"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
     username: Mapped[str] = mapped_column(String[50], unique=True, nullable=False, index=True)
     email:  Mapped[str] = mapped_column(String[255], unique=True, nullable=False, index=True)
     password_hash:  Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    followers_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    posts_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     
     posts: Mapped[List["Post"]] = relationship("Post", back_populates="user", cascade="all, delete-orphan",)
 
 
+POST_TITLE_MAX_LENGTH = 200
+
+
 class Post(Base):
     __tablename__ = "posts"
+    # bounded so (title, id) stays a sensible btree for sort_by=title
+    __table_args__ = (CheckConstraint(f"length(title) <= {POST_TITLE_MAX_LENGTH}", name="ck_posts_title_length"),)
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(Text, nullable=False)
     content:  Mapped[str] = mapped_column(Text, nullable=False)
     created_at:  Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
@@ -31,6 +38,7 @@ class Post(Base):
     user_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     likes: Mapped[int] = mapped_column(Integer, default=0)
     is_published: Mapped[bool] = mapped_column(Boolean, default=True)
+    comments_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     
     user: Mapped[Optional[User]] = relationship("User", back_populates="posts",)
     comments: Mapped[List["Comments"]] = relationship("Comments",  back_populates="post", cascade="all, delete-orphan")
@@ -39,7 +47,7 @@ class Post(Base):
 class Comments(Base):
     __tablename__ = "comments"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
     post_id: Mapped[int] = mapped_column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
@@ -47,4 +55,36 @@ class Comments(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
 
     post: Mapped["Post"] = relationship("Post", back_populates="comments")
-    user: Mapped["User"] = relationship("User")
\ No newline at end of file
+    user: Mapped["User"] = relationship("User")
+
+
+class Follow(Base):
+    __tablename__ = "follows"
+
+    follower_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    followee_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+
+class RowCount(Base):
+    """ Maintained table-wide totals, so listings never need COUNT(*) over a whole table """
+    __tablename__ = "row_counts"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+
+
+# serves the per-post comment listing: WHERE post_id = ? ORDER BY created_at DESC, id DESC
+# (read backwards, all columns share one direction so row comparisons can use it)
+Index("ix_comments_post_id_created_at_id", Comments.post_id, Comments.created_at, Comments.id)
+
+# post listings: ORDER BY created_at with id as the keyset tiebreaker
+Index("ix_posts_created_at_id", Post.created_at, Post.id)
+# author filtered listings, timeline backfill and feed pulls
+Index("ix_posts_user_id_created_at_id", Post.user_id, Post.created_at, Post.id)
+# title-sorted listings, offset and keyset
+Index("ix_posts_title_id", Post.title, Post.id)
+
+# fan-out reads every follower of an author
+Index("ix_follows_followee_id_follower_id", Follow.followee_id, Follow.follower_id)
@@ -0,0 +1,64 @@
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from errors import AppError
+
+
+def encode_cursor(payload: dict) -> str:
+    """ Encode a keyset position into an opaque url-safe token """
+    raw = json.dumps(payload, default=_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, parse_value: Callable[[Any], Any]) -> dict:
+    """
+    Decode a token produced by encode_cursor, raising AppError if it is malformed.
+    `id` must be an integer and `v` is replaced by parse_value(v), one of the
+    parse_* helpers below matching the type of the column the listing seeks on.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise _malformed()
+
+    if not isinstance(payload, dict) or "id" not in payload or "v" not in payload:
+        raise _malformed()
+    # bool is an int subclass, but never a row id
+    if not isinstance(payload["id"], int) or isinstance(payload["id"], bool):
+        raise _malformed()
+    payload["v"] = parse_value(payload["v"])
+    return payload
+
+
+def parse_datetime(value: Any) -> datetime:
+    """ Cursor values for timestamp columns are stored as ISO strings """
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise _malformed()
+
+
+def parse_str(value: Any) -> str:
+    if not isinstance(value, str):
+        raise _malformed()
+    return value
+
+
+def parse_number(value: Any) -> float:
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+        raise _malformed()
+    return value
+
+
+def _malformed() -> AppError:
+    return AppError("INVALID_CURSOR", "Cursor is malformed", status_code=400)
+
+
+def _default(value: Any) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value)!r} in cursor")
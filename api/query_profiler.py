@@ -0,0 +1,126 @@
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar, Token
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logging_config import get_logger
+
+logger = get_logger("query_profiler")
+
+APP_ENV = os.getenv("APP_ENV", "dev")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# run EXPLAIN (not ANALYZE) for slow SELECTs on Postgres and log the plan
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+# the same statement this many times in one request is reported as a likely N+1
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", "5"))
+# requests issuing more statements than this are reported
+REQUEST_QUERY_BUDGET = int(os.getenv("REQUEST_QUERY_BUDGET", "20"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true" if APP_ENV == "dev" else "false").lower() in ("1", "true", "yes")
+
+_EXPLAINING = "query_profiler_explaining"
+
+
+class QueryStats:
+    """ Statements issued while handling one request """
+
+    __slots__ = ("count", "seconds", "shapes", "closed")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        # SQLAlchemy renders bound parameters as placeholders, so equal text means equal shape
+        self.shapes: Counter = Counter()
+        self.closed = False
+
+    def record(self, statement: str, seconds: float) -> None:
+        if self.closed:
+            # e.g. a cache refresh scheduled by the request, running after it finished
+            return
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement] += 1
+
+
+_stats_ctx: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start_request() -> Tuple[QueryStats, Token]:
+    stats = QueryStats()
+    return stats, _stats_ctx.set(stats)
+
+
+def finish_request(stats: QueryStats, token: Token, method: str, path: str) -> None:
+    """ Close the request's stats and report repeated shapes and blown budgets """
+    stats.closed = True
+    _stats_ctx.reset(token)
+
+    for statement, times in stats.shapes.items():
+        if times >= REPEATED_QUERY_THRESHOLD:
+            logger.warning(
+                "Statement repeated %d times in %s %s, likely N+1: %s",
+                times, method, path, _shorten(statement),
+                extra={"event": "REPEATED_QUERY", "times": times},
+            )
+    if stats.count > REQUEST_QUERY_BUDGET:
+        logger.warning(
+            "%s %s issued %d statements (%.1fms in the database)",
+            method, path, stats.count, stats.seconds * 1000,
+            extra={"event": "QUERY_BUDGET", "queries": stats.count, "db_ms": round(stats.seconds * 1000, 1)},
+        )
+
+
+def server_timing(stats: QueryStats) -> bytes:
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'.encode()
+
+
+def install(engine: Engine) -> None:
+    """ Hook statement timing into an engine; pass async_engine.sync_engine for async engines """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._profiler_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get(_EXPLAINING):
+            return
+        seconds = time.perf_counter() - context._profiler_start
+        stats = _stats_ctx.get()
+        if stats is not None:
+            stats.record(statement, seconds)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            _report_slow(conn, statement, None if executemany else parameters, seconds)
+
+
+def _report_slow(conn, statement: str, parameters, seconds: float) -> None:
+    plan = None
+    explainable = (
+        SLOW_QUERY_EXPLAIN
+        and parameters is not None
+        and conn.dialect.name == "postgresql"
+        and statement.lstrip()[:6].upper() == "SELECT"
+    )
+    if explainable:
+        conn.info[_EXPLAINING] = True
+        try:
+            rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+            plan = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        finally:
+            conn.info.pop(_EXPLAINING, None)
+
+    logger.warning(
+        "Slow query (%.1fms): %s",
+        seconds * 1000, _shorten(statement),
+        extra={"event": "SLOW_QUERY", "duration_ms": round(seconds * 1000, 1), "plan": plan},
+    )
+
+
+def _shorten(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
@@ -1,33 +1,62 @@
-from typing import List
+from typing import List, Literal, Optional
 from datetime import datetime
 from logging_config import get_logger
 from services import comments as comments_service
+from schemas.bulk import BulkResult
 from schemas.comments import CommentOut, PaginatedComment, CommentCreate
-from fastapi import APIRouter, Depends, HTTPException, Query
+from services.bulk import BULK_BATCH_SIZE, BULK_MAX_BATCH_SIZE
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel, ConfigDict
 from services.users import get_current_user
-from models import Comments, Post, User
-from sqlalchemy.orm import Session
+from models import Comments, Post
+from schemas.users import UserOut
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
+from http_cache import conditional_response
+from export import export_response
 
 logger = get_logger("routers.comments")
 router = APIRouter(tags=["posts-comment"])
 
 @router.get("/post/{post_id}/comments", response_model=PaginatedComment)
-def get_comments(
+async def get_comments(
     post_id: int,
+    request: Request,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    pagination: Literal["offset", "cursor"] = Query("offset"),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
 ):  
-    comments, total, has_next, has_prev = comments_service.list_comments(db, post_id, page, limit)
+    if cursor is not None or pagination == "cursor":
+        comments, total, next_cursor, prev_cursor = await comments_service.list_comments_keyset(
+            db, post_id, cursor, limit
+        )
+        if comments is None:
+            logger.error("Post not found: id=%s", post_id, extra={"event": "POST_NOT_FOUND", "post_id": post_id})
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        result = PaginatedComment(
+            items=comments,
+            page=page,
+            limit=limit,
+            total=total,
+            has_next=next_cursor is not None,
+            has_prev=prev_cursor is not None,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+        )
+        return conditional_response(request, orjson.dumps(result.model_dump(mode="json")))
+
+    comments, total, has_next, has_prev = await comments_service.list_comments(db, post_id, page, limit)
 
     if comments is None:
-        logger.error(f"Post not found: id={post_id}", extra={"event": "POST_NOT_FOUND", "post_id": post_id})
-        raise HTTPException(status_code=404, detail=str(e))
+        logger.error("Post not found: id=%s", post_id, extra={"event": "POST_NOT_FOUND", "post_id": post_id})
+        raise HTTPException(status_code=404, detail="Post not found")
         
-    return PaginatedComment(
+    result = PaginatedComment(
         items=comments,
         page=page,
         limit=limit,
@@ -35,18 +64,57 @@ def get_comments(
         has_next=has_next,
         has_prev=has_prev
     )
+    return conditional_response(request, orjson.dumps(result.model_dump(mode="json")))
+
+@router.get("/post/{post_id}/comments/export")
+async def export_comments(
+    post_id: int,
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if await comments_service.comment_total(db, post_id) is None:
+        logger.error("Post not found: id=%s", post_id, extra={"event": "POST_NOT_FOUND", "post_id": post_id})
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    stmt = comments_service.export_comments_query(post_id, created_after, created_before)
+    return export_response(
+        request, stmt, fields=comments_service.EXPORT_FIELDS, fmt=format, filename=f"post-{post_id}-comments"
+    )
 
 @router.post("/post/{post_id}/comment", response_model=CommentOut)
-def create_comment(
+async def create_comment(
     post_id: int,
     payload: CommentCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_user)
 ):
     try:
-        comment = comments_service.create_comment(db, post_id, payload.content, current_user.id)
+        comment = await comments_service.create_comment(db, post_id, payload.content, current_user.id)
         logger.info("Comment added", extra={"post_id": post_id})
         return comment
-    except Exception as e:
-        logger.error(f"Post not found: id={post_id}", extra={"event": "POST_NOT_FOUND", "post_id": post_id})
-        raise HTTPException(status_code=404, detail=str(e))
\ No newline at end of file
+    except LookupError as e:
+        logger.error("Post not found: id=%s", post_id, extra={"event": "POST_NOT_FOUND", "post_id": post_id})
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/post/{post_id}/comments/bulk", response_model=BulkResult)
+async def bulk_create_comments(
+    post_id: int,
+    request: Request,
+    batch_size: int = Query(BULK_BATCH_SIZE, ge=1, le=BULK_MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_user)
+):
+    """ Body is NDJSON, one {"content", "created_at"?} object per line """
+    try:
+        result = await comments_service.bulk_create_comments(
+            db, post_id, current_user.id, request.stream(), batch_size
+        )
+    except LookupError as e:
+        logger.error("Post not found: id=%s", post_id, extra={"event": "POST_NOT_FOUND", "post_id": post_id})
+        raise HTTPException(status_code=404, detail=str(e))
+    logger.info("Bulk comments imported", extra={"post_id": post_id, "inserted": result.inserted, "failed": result.failed})
+    return result
@@ -0,0 +1,55 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from database import get_async_db
+from logging_config import get_logger
+from schemas.posts import FeedPage
+from schemas.users import UserOut
+from services import feed as feed_service
+from services.users import get_current_user
+from tasks.feed import backfill_timeline, prune_timeline
+
+logger = get_logger("routers.feed")
+router = APIRouter(tags=["feed"])
+
+
+@router.post("/users/{user_id}/follow")
+async def follow_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_user),
+):
+    created = await feed_service.follow_user(db, current_user.id, user_id)
+    if created is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    if created:
+        await run_in_threadpool(backfill_timeline.delay, current_user.id, user_id)
+        logger.info("User followed", extra={"user_id": current_user.id, "followee_id": user_id})
+    return {"success": True, "following": True}
+
+
+@router.delete("/users/{user_id}/follow")
+async def unfollow_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_user),
+):
+    removed = await feed_service.unfollow_user(db, current_user.id, user_id)
+    if removed:
+        await run_in_threadpool(prune_timeline.delay, current_user.id, user_id)
+    return {"success": True, "following": False}
+
+
+@router.get("/feed", response_model=FeedPage)
+async def get_feed(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_user),
+):
+    # already encoded from cached post bodies, bypass response_model
+    body = await feed_service.read_feed(db, current_user.id, cursor, limit)
+    return Response(content=body, media_type="application/json")
@@ -1,72 +1,135 @@
+from datetime import datetime
 from typing import Literal, Optional
-from fastapi import Depends, Query, HTTPException, APIRouter, status
+import orjson
+from fastapi import Depends, Query, HTTPException, APIRouter, Request, status
 from logging_config import get_logger
-from sqlalchemy.orm import Session
-from models import User
+from sqlalchemy.ext.asyncio import AsyncSession
+from schemas.users import UserOut
 from services.users import get_current_user
+from schemas.bulk import BulkResult
 from schemas.posts import PaginatedPosts, PostOut, PostCreate
 from fastapi_limiter.depends import RateLimiter
-from database import get_db
+from starlette.concurrency import run_in_threadpool
+from database import get_async_db
+from http_cache import conditional_response
+from export import export_response
 from services import posts as post_service
+from services import likes as like_service
+from services.bulk import BULK_BATCH_SIZE, BULK_MAX_BATCH_SIZE
 from tasks.notifications import send_new_post_notification
+from tasks.feed import fan_out_post
+from services.feed import post_score
 
 logger = get_logger("routers.posts")
 router = APIRouter(tags=["micro-posts"])
 
 @router.get("/posts", response_model=PaginatedPosts, dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def list_post(
+async def list_post(
+    request: Request,
     page: int = Query(default=1, ge=1), 
     limit: int = Query(default=10, ge=1, le=100),
     search: str|None = Query(default=None),
-    sort_by:Literal["created_at", "title"] = Query(default="created_at"),
+    sort_by:Literal["created_at", "title", "relevance"] = Query(default="created_at"),
     order: Literal["asc", "desc"] = Query(default="desc"),
     author_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db),
+    pagination: Literal["offset", "cursor"] = Query(default="offset"),
+    cursor: Optional[str] = Query(default=None),
+    include: Optional[str] = Query(default=None, description="Comma separated: author,comment_count"),
+    exact_total: bool = Query(default=True, description="false skips computing total (offset mode)"),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    items, total = post_service.list_post(
-        db=db,
-        page=page,
-        limit=limit,
-        search=search,
-        sort_by=sort_by,
-        order=order,
-        author_id=author_id,
-    )
+    includes = post_service.parse_include(include)
 
-    has_next = (page * limit) < total
-    has_prev = page > 1
+    # a cursor always means keyset mode, `pagination=cursor` starts it from the first page
+    # both paths return the final encoded page, so response_model is bypassed on purpose
+    if cursor is not None or pagination == "cursor":
+        body = await post_service.list_post_keyset(
+            db=db,
+            cursor=cursor,
+            page=page,
+            limit=limit,
+            search=search,
+            sort_by=sort_by,
+            order=order,
+            author_id=author_id,
+            include=includes,
+        )
+    else:
+        body = await post_service.list_post(
+            db=db,
+            page=page,
+            limit=limit,
+            search=search,
+            sort_by=sort_by,
+            order=order,
+            author_id=author_id,
+            include=includes,
+            exact_total=exact_total,
+        )
+    return conditional_response(request, body)
 
-    return PaginatedPosts(
-        items=items,
-        page=page,
-        limit=limit,
-        total=total,
-        has_next=has_next,
-        has_prev=has_prev,
+
+@router.get("/posts/export", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def export_posts(
+    request: Request,
+    format: Literal["ndjson", "csv"] = Query(default="ndjson"),
+    author_id: Optional[int] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+):
+    """ Every matching post, streamed; gzipped when the client sends Accept-Encoding: gzip """
+    stmt = post_service.export_posts_query(
+        author_id=author_id, created_after=created_after, created_before=created_before
     )
-              
+    logger.info("Posts export started", extra={"author_id": author_id, "format": format})
+    return export_response(request, stmt, fields=post_service.EXPORT_FIELDS, fmt=format, filename="posts")
 
 
 @router.get("/post/{post_id}", response_model=PostOut)
-def get_post(post_id: int,  db: Session = Depends(get_db),):
-    post = post_service.get_post(db, post_id=post_id)
+async def get_post(post_id: int, request: Request, db: AsyncSession = Depends(get_async_db),):
+    post = await post_service.get_post_data(db, post_id=post_id)
     if post is None:
         logger.error("Post not found", extra={"event": "POST_NOT_FOUND", "post_id": post_id})
         raise HTTPException(status_code=404, detail="Post not found")
-    return post
+    return conditional_response(
+        request,
+        post["body"].encode(),
+        etag=post["etag"],
+        last_modified=datetime.fromisoformat(post["updated_at"]),
+    )
     
 @router.post("/post", response_model=PostOut, dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def create_post(post: PostCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    new_post = post_service.create_post(
+async def create_post(post: PostCreate, db: AsyncSession = Depends(get_async_db), current_user: UserOut = Depends(get_current_user)):
+    new_post = await post_service.create_post(
         db, user_id=current_user.id, data=post
     )
-    send_new_post_notification.delay(new_post.id, new_post.title)
+    # publishing to the broker is blocking I/O (and retries if it is down), keep it off the event loop
+    await run_in_threadpool(send_new_post_notification.delay, new_post.id, new_post.title)
+    await run_in_threadpool(fan_out_post.delay, new_post.id, new_post.user_id, post_score(new_post.created_at))
     return new_post
 
 
+@router.post("/posts/bulk", response_model=BulkResult, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def bulk_create_posts(
+    request: Request,
+    batch_size: int = Query(default=BULK_BATCH_SIZE, ge=1, le=BULK_MAX_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_user),
+):
+    """ Body is NDJSON, one {"title", "content", "created_at"?} object per line """
+    result = await post_service.bulk_create_posts(
+        db, user_id=current_user.id, chunks=request.stream(), batch_size=batch_size
+    )
+    logger.info(
+        "Bulk posts imported",
+        extra={"user_id": current_user.id, "inserted": result.inserted, "failed": result.failed},
+    )
+    return result
+
+
 @router.delete("/post/{post_id}")
-def delete_post(post_id: int, db: Session = Depends(get_db)):
-    ok = post_service.delete_post(db, post_id=post_id)
+async def delete_post(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    ok = await post_service.delete_post(db, post_id=post_id)
     if not ok:
         logger.warning(
             "Delete failed, post not found",
@@ -81,8 +144,8 @@ def delete_post(post_id: int, db: Session = Depends(get_db)):
 
 
 @router.put("/post/{post_id}", response_model=PostOut)
-def update_post(post_id: int, payload: PostCreate, db: Session = Depends(get_db)):
-    updated = post_service.update_post(db, post_id=post_id, data=payload)
+async def update_post(post_id: int, payload: PostCreate, db: AsyncSession = Depends(get_async_db)):
+    updated = await post_service.update_post(db, post_id=post_id, data=payload)
     if updated is None:
         logger.warning(
             "Update failed, post not found",
@@ -94,3 +157,21 @@ def update_post(post_id: int, payload: PostCreate, db: Session = Depends(get_db)
         )
     logger.info("Post updated", extra={"post_id": post_id})
     return updated
+
+
+@router.post("/post/{post_id}/like")
+async def like_post(post_id: int, db: AsyncSession = Depends(get_async_db), current_user: UserOut = Depends(get_current_user)):
+    post = await post_service.get_post_data(db, post_id=post_id)
+    if post is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    changed, likes = await like_service.like_post(post_id, current_user.id, orjson.loads(post["body"])["likes"])
+    return {"post_id": post_id, "liked": True, "changed": changed, "likes": likes}
+
+
+@router.delete("/post/{post_id}/like")
+async def unlike_post(post_id: int, db: AsyncSession = Depends(get_async_db), current_user: UserOut = Depends(get_current_user)):
+    post = await post_service.get_post_data(db, post_id=post_id)
+    if post is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    changed, likes = await like_service.unlike_post(post_id, current_user.id, orjson.loads(post["body"])["likes"])
+    return {"post_id": post_id, "liked": False, "changed": changed, "likes": likes}
@@ -1,35 +1,37 @@
 
 from logging_config import get_logger
 from schemas.users import UserSignup, UserOut
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Request, status, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 
 from auth import create_access_token
 from services.users import is_existing_user, login_user, signup_user
-from database import get_db
+from database import get_async_db
 
 logger = get_logger("routers.users")
 
 router = APIRouter()
 
 @router.post("/signup", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def signup(user: UserSignup, db: Session = Depends(get_db)):
-    existing_user = is_existing_user(db, user)
+async def signup(user: UserSignup, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await is_existing_user(db, user)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username or email already exists",
         )
-    new_user = signup_user(db, user)
+    new_user = await signup_user(db, user)
     return new_user
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = login_user(db, form_data)
+    client_ip = request.client.host if request.client else None
+    user = await login_user(db, form_data, client_ip)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
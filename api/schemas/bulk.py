@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class BulkRowError(BaseModel):
+    line: int
+    error: str
+
+class BulkResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
+    # only the first BULK_MAX_ERRORS failures are listed
+    errors_truncated: bool = False
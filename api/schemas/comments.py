@@ -1,10 +1,20 @@
-from pydantic import BaseModel, ConfigDict
-from typing import List
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import List, Optional
+from datetime import datetime, timezone
 
 class CommentCreate(BaseModel):
     content: str
 
+class CommentBulkItem(CommentCreate):
+    created_at: Optional[datetime] = None
+
+    @field_validator("created_at")
+    @classmethod
+    def to_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 class CommentOut(BaseModel):
     id: int
     post_id: int
@@ -21,4 +31,6 @@ class PaginatedComment(BaseModel):
     limit: int
     total: int
     has_next: bool
-    has_prev: bool
\ No newline at end of file
+    has_prev: bool
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
\ No newline at end of file
@@ -1,12 +1,24 @@
-from datetime import datetime
-from pydantic import BaseModel, ConfigDict
+from datetime import datetime, timezone
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, List
 
 
 class PostCreate(BaseModel):
-    title: str
+    # matches ck_posts_title_length (models.POST_TITLE_MAX_LENGTH)
+    title: str = Field(max_length=200)
     content: str
 
+class PostBulkItem(PostCreate):
+    # legacy imports keep their original timestamps
+    created_at: Optional[datetime] = None
+
+    @field_validator("created_at")
+    @classmethod
+    def to_naive_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
 class PostOut(BaseModel):
     id: int
     user_id: Optional[int]
@@ -17,13 +29,31 @@ class PostOut(BaseModel):
     likes: int
     model_config = ConfigDict(from_attributes=True)
 
+class AuthorOut(BaseModel):
+    id: int
+    username: str
+
+class PostListItem(PostOut):
+    # only present when requested with ?include=author,comment_count
+    author: Optional[AuthorOut] = None
+    comment_count: Optional[int] = None
+
 class PaginatedPosts(BaseModel):
-    items: List[PostOut]
+    items: List[PostListItem]
     page: int
     limit: int
-    total: int
+    total: Optional[int] = None
+    # planner estimate rather than an exact count (search listings on Postgres)
+    total_estimated: bool = False
     has_next: bool
     has_prev: bool
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+class FeedPage(BaseModel):
+    items: List[PostOut]
+    limit: int
+    next_cursor: Optional[str] = None
 
 class CommentCreate(BaseModel):
     content: str
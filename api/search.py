@@ -0,0 +1,203 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import Select, case, func, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cache
+from logging_config import get_logger
+from models import Post
+
+logger = get_logger("search")
+
+TS_CONFIG = "english"
+TITLE_WEIGHT = 2
+CONTENT_WEIGHT = 1
+# bumped by every index write; workers whose index was built at another value rebuild it
+SEARCH_GEN_KEY = "search:gen"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def substring_match(term: str):
+    """ The whole term anywhere in the title or content, case-insensitively; shared by both backends """
+    return or_(Post.title.ilike(f"%{term}%"), Post.content.ilike(f"%{term}%"))
+
+
+class PostgresFullText:
+    """
+    Uses the posts.search_vector generated column (GIN indexed) for word matches,
+    with pg_trgm indexes on title/content picking up plain substring matches.
+    """
+
+    async def apply(self, db: AsyncSession, stmt: Select, term: str) -> Select:
+        return stmt.where(
+            or_(literal_column("posts.search_vector").op("@@")(self._tsquery(term)), substring_match(term))
+        )
+
+    async def rank(self, db: AsyncSession, term: str):
+        return func.ts_rank_cd(literal_column("posts.search_vector"), self._tsquery(term))
+
+    async def index_post(self, *posts: Post) -> None:
+        # the generated column is maintained by Postgres itself
+        pass
+
+    async def remove_post(self, post_id: int) -> None:
+        pass
+
+    def _tsquery(self, term: str):
+        return func.websearch_to_tsquery(TS_CONFIG, term)
+
+
+class InvertedIndex:
+    """
+    In-process inverted index for SQLite / test runs.
+    Built lazily from the posts table on first search and kept current by the
+    post services. A post matches when every query token matches a word or a
+    word prefix, or, as on Postgres, when the whole term is a substring of the
+    title or content. Prefixes stand in for stemming, so "run" finds "running"
+    but "running" does not find "run"; websearch operators are not parsed.
+
+    Each worker has its own copy. Writes bump SEARCH_GEN_KEY in the shared cache,
+    and a search that sees a value other than the one this copy is at rebuilds it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._terms: List[str] = []
+        self._doc_terms: Dict[int, Set[str]] = {}
+        self._built = False
+        self._generation = 0
+
+    async def apply(self, db: AsyncSession, stmt: Select, term: str) -> Select:
+        scores = await self._scores(db, term)
+        return stmt.where(or_(Post.id.in_(scores.keys()), substring_match(term)))
+
+    async def rank(self, db: AsyncSession, term: str):
+        scores = await self._scores(db, term)
+        if not scores:
+            return literal_column("0")
+        return case(scores, value=Post.id, else_=0)
+
+    async def index_post(self, *posts: Post) -> None:
+        with self._lock:
+            if self._built:
+                for post in posts:
+                    self._add(post.id, post.title, post.content)
+        await self._bump_generation()
+
+    async def remove_post(self, post_id: int) -> None:
+        with self._lock:
+            if self._built:
+                self._remove(post_id)
+        await self._bump_generation()
+
+    async def _bump_generation(self) -> None:
+        await cache.incr(SEARCH_GEN_KEY)
+        (generation,) = await cache.get_counters([SEARCH_GEN_KEY])
+        with self._lock:
+            # anything but our own single bump means another worker wrote in between
+            if generation == self._generation + 1:
+                self._generation = generation
+            else:
+                self._reset()
+
+    async def _scores(self, db: AsyncSession, term: str) -> Dict[int, int]:
+        await self._ensure_built(db)
+        tokens = tokenize(term)
+        if not tokens:
+            return {}
+
+        with self._lock:
+            result: Optional[Dict[int, int]] = None
+            for token in tokens:
+                matches: Dict[int, int] = defaultdict(int)
+                for indexed in self._expand(token):
+                    for post_id, weight in self._postings[indexed].items():
+                        matches[post_id] += weight
+                if result is None:
+                    result = dict(matches)
+                else:
+                    result = {pid: result[pid] + w for pid, w in matches.items() if pid in result}
+                if not result:
+                    return {}
+            return result or {}
+
+    def _expand(self, token: str) -> Iterable[str]:
+        """ All indexed terms starting with token, found by bisecting the sorted vocabulary """
+        idx = bisect_left(self._terms, token)
+        while idx < len(self._terms) and self._terms[idx].startswith(token):
+            yield self._terms[idx]
+            idx += 1
+
+    async def _ensure_built(self, db: AsyncSession) -> None:
+        # read before the rows, so a write landing in between triggers another rebuild
+        (generation,) = await cache.get_counters([SEARCH_GEN_KEY])
+        with self._lock:
+            if self._built and generation == self._generation:
+                return
+        rows = (await db.execute(select(Post.id, Post.title, Post.content))).all()
+        with self._lock:
+            self._reset()
+            for post_id, title, content in rows:
+                self._add(post_id, title, content)
+            self._built = True
+            self._generation = generation
+        logger.info("Built in-process search index for %d posts at generation %d", len(rows), generation)
+
+    def _reset(self) -> None:
+        self._postings.clear()
+        self._terms.clear()
+        self._doc_terms.clear()
+        self._built = False
+
+    def _add(self, post_id: int, title: str, content: str) -> None:
+        self._remove(post_id)
+        weights: Dict[str, int] = defaultdict(int)
+        for token in tokenize(title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(content):
+            weights[token] += CONTENT_WEIGHT
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._terms.insert(bisect_left(self._terms, token), token)
+            self._postings[token][post_id] = weight
+        self._doc_terms[post_id] = set(weights)
+
+    def _remove(self, post_id: int) -> None:
+        for token in self._doc_terms.pop(post_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(post_id, None)
+            if not postings:
+                del self._postings[token]
+                self._terms.pop(bisect_left(self._terms, token))
+
+
+_postgres = PostgresFullText()
+_inverted_index = InvertedIndex()
+
+
+def get_backend(db: AsyncSession):
+    """ Pick the search backend matching the session's database dialect """
+    if db.bind.dialect.name == "postgresql":
+        return _postgres
+    return _inverted_index
+
+
+async def index_post(db: AsyncSession, *posts: Post) -> None:
+    await get_backend(db).index_post(*posts)
+
+
+async def remove_post(db: AsyncSession, post_id: int) -> None:
+    await get_backend(db).remove_post(post_id)
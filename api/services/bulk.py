@@ -0,0 +1,142 @@
+import os
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from errors import AppError
+from logging_config import get_logger
+from schemas.bulk import BulkResult, BulkRowError
+
+logger = get_logger("services.bulk")
+
+# rows per INSERT ... RETURNING statement and per transaction
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_MAX_BATCH_SIZE = int(os.getenv("BULK_MAX_BATCH_SIZE", "5000"))
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", "1000"))
+# a single NDJSON line larger than this aborts the upload instead of buffering it
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(1024 * 1024)))
+
+# write(rows) inserts one batch without committing and returns one item per inserted row,
+# which after() receives once the batch is committed
+Write = Callable[[List[dict]], Awaitable[Sequence]]
+After = Callable[[Sequence], Awaitable[None]]
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """ Split a byte stream into (line number, line), skipping blank lines """
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" in chunk:
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    yield line_no, line
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            raise AppError("LINE_TOO_LONG", f"Line {line_no + 1} exceeds {BULK_MAX_LINE_BYTES} bytes", status_code=413)
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+
+class _Collector:
+    def __init__(self) -> None:
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[BulkRowError] = []
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < BULK_MAX_ERRORS:
+            self.errors.append(BulkRowError(line=line, error=message))
+
+    def result(self) -> BulkResult:
+        return BulkResult(
+            received=self.received,
+            inserted=self.inserted,
+            failed=self.failed,
+            errors=self.errors,
+            errors_truncated=self.failed > len(self.errors),
+        )
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in e.errors(include_url=False)
+    )
+
+
+async def ingest(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    *,
+    schema: Type[BaseModel],
+    to_row: Callable[[BaseModel], dict],
+    write: Write,
+    after: Optional[After] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> BulkResult:
+    """
+    Validate an NDJSON stream line by line and insert it in batches of
+    batch_size, one statement and one commit per batch. Bad lines are reported
+    and skipped. If a whole batch is rejected by the database it is retried row
+    by row so the good rows still land and the bad ones are pinpointed.
+    """
+    collector = _Collector()
+    batch: List[Tuple[int, dict]] = []
+
+    async for line_no, line in iter_ndjson(chunks):
+        collector.received += 1
+        try:
+            item = schema.model_validate_json(line)
+        except ValidationError as e:
+            collector.error(line_no, _validation_message(e))
+            continue
+        batch.append((line_no, to_row(item)))
+        if len(batch) >= batch_size:
+            await _flush(db, batch, write, after, collector)
+            batch = []
+
+    if batch:
+        await _flush(db, batch, write, after, collector)
+
+    logger.info(
+        "Bulk ingest finished",
+        extra={"received": collector.received, "inserted": collector.inserted, "failed": collector.failed},
+    )
+    return collector.result()
+
+
+async def _flush(
+    db: AsyncSession,
+    batch: List[Tuple[int, dict]],
+    write: Write,
+    after: Optional[After],
+    collector: _Collector,
+) -> None:
+    try:
+        written = await write([row for _, row in batch])
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.warning("Bulk batch rejected, retrying row by row: %s", e.__class__.__name__)
+        written = []
+        for line_no, row in batch:
+            try:
+                row_written = await write([row])
+                await db.commit()
+                written.extend(row_written)
+            except SQLAlchemyError as row_error:
+                await db.rollback()
+                collector.error(line_no, str(getattr(row_error, "orig", None) or row_error))
+        collector.inserted += len(written)
+    else:
+        collector.inserted += len(batch)
+
+    if after is not None and written:
+        await after(written)
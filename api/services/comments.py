@@ -1,26 +1,163 @@
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
-
+from export import naive_utc
 from models import Comments, Post
-from sqlalchemy.orm import Session
+from pagination import decode_cursor, encode_cursor, parse_datetime
+from schemas.bulk import BulkResult
+from schemas.comments import CommentBulkItem
+from services import bulk
+from services import posts as post_service
+from sqlalchemy import Select, asc, desc, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-def list_comments(db: Session, post_id: int, page: int, limit: int):
-    offset = (page -1) * limit    
-    comments = db.query(Comments).filter(Comments.post_id == post_id)
-    total = comments.count()
-    if comments.count() == 0:
+
+async def comment_total(db: AsyncSession, post_id: int) -> Optional[int]:
+    """ Denormalized comment count for a post, None if the post does not exist """
+    return await db.scalar(select(Post.comments_count).where(Post.id == post_id))
+
+
+async def list_comments(db: AsyncSession, post_id: int, page: int, limit: int):
+    total = await comment_total(db, post_id)
+    if total is None:
+        return None, 0, False, False
+    if total == 0:
         return [], 0, False, False
-    comments = comments.order_by(Comments.created_at.desc()).offset(offset).limit(limit).all()
+
+    offset = (page -1) * limit    
+    comments = (await db.scalars(
+        select(Comments)
+        .where(Comments.post_id == post_id)
+        .order_by(Comments.created_at.desc(), Comments.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )).all()
     has_next = (page * limit) < total
     has_prev = page > 1
     return comments, total, has_next, has_prev
 
-def create_comment(db: Session, post_id: int, content: str, user_id: int):
-    post = db.query(Post).filter(Post.id == post_id)
+
+async def list_comments_keyset(
+    db: AsyncSession, post_id: int, cursor: Optional[str], limit: int
+) -> Tuple[Optional[List[Comments]], int, Optional[str], Optional[str]]:
+    """
+    Newest-first comments seeking on (created_at, id), served by
+    ix_comments_post_id_created_at_id. Returns items, total, next and prev cursors.
+    """
+    total = await comment_total(db, post_id)
+    if total is None:
+        return None, 0, None, None
+
+    position = decode_cursor(cursor, parse_datetime) if cursor else None
+    backward = bool(position and position.get("b"))
+
+    stmt = select(Comments).where(Comments.post_id == post_id)
+    if position is not None:
+        key = tuple_(Comments.created_at, Comments.id)
+        bound = tuple_(position["v"], position["id"])
+        stmt = stmt.where(key > bound if backward else key < bound)
+
+    direction = asc if backward else desc
+    rows = list((await db.scalars(
+        stmt.order_by(direction(Comments.created_at), direction(Comments.id))
+        .limit(limit + 1)
+    )).all())
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if has_more or backward:
+            next_cursor = _cursor_for(rows[-1], backward=False)
+        if (has_more and backward) or (position is not None and not backward):
+            prev_cursor = _cursor_for(rows[0], backward=True)
+
+    return rows, total, next_cursor, prev_cursor
+
+
+async def create_comment(db: AsyncSession, post_id: int, content: str, user_id: int):
+    post = await db.get(Post, post_id)
     if post is None:
-        raise "None"
+        raise LookupError(f"Post {post_id} not found")
 
     comment = Comments(post_id=post_id, content=content, user_id=user_id)
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
-    return comment
\ No newline at end of file
+    # atomic increment so concurrent comments never lose an update
+    await db.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(comments_count=Post.comments_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await post_service.invalidate_comment_count(post_id)
+    await db.refresh(comment)
+    return comment
+
+
+EXPORT_FIELDS = ("id", "post_id", "user_id", "content", "created_at", "updated_at")
+
+
+def export_comments_query(
+    post_id: int, created_after: Optional[datetime], created_before: Optional[datetime]
+) -> Select:
+    created_after, created_before = naive_utc(created_after), naive_utc(created_before)
+    stmt = select(*(getattr(Comments, field) for field in EXPORT_FIELDS)).where(Comments.post_id == post_id)
+    if created_after is not None:
+        stmt = stmt.where(Comments.created_at >= created_after)
+    if created_before is not None:
+        stmt = stmt.where(Comments.created_at < created_before)
+    return stmt.order_by(Comments.id)
+
+
+async def bulk_create_comments(
+    db: AsyncSession,
+    post_id: int,
+    user_id: int,
+    chunks: AsyncIterator[bytes],
+    batch_size: int = bulk.BULK_BATCH_SIZE,
+) -> BulkResult:
+    """
+    NDJSON import of comments on one post. Each batch is a single executemany
+    insert plus one counter update, committed together; the cached count is
+    evicted after every commit, as a later line can still abort the upload.
+    """
+    if await comment_total(db, post_id) is None:
+        raise LookupError(f"Post {post_id} not found")
+
+    now = datetime.utcnow()
+
+    def to_row(item: CommentBulkItem) -> dict:
+        created_at = item.created_at or now
+        return {
+            "post_id": post_id,
+            "user_id": user_id,
+            "content": item.content,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    async def write(rows: List[dict]) -> Sequence[int]:
+        ids = (await db.scalars(insert(Comments).returning(Comments.id), rows)).all()
+        await db.execute(
+            update(Post)
+            .where(Post.id == post_id)
+            .values(comments_count=Post.comments_count + len(ids))
+            .execution_options(synchronize_session=False)
+        )
+        return ids
+
+    async def after(ids: Sequence[int]) -> None:
+        await post_service.invalidate_comment_count(post_id)
+
+    return await bulk.ingest(
+        db, chunks, schema=CommentBulkItem, to_row=to_row, write=write, after=after, batch_size=batch_size
+    )
+
+
+def _cursor_for(comment: Comments, *, backward: bool) -> str:
+    return encode_cursor({"v": comment.created_at, "id": comment.id, "b": backward})
@@ -0,0 +1,169 @@
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Set, Tuple
+
+import orjson
+from sqlalchemy import Select, delete, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cache
+from errors import AppError
+from models import Follow, Post, User
+from pagination import decode_cursor, encode_cursor, parse_number
+from services import posts as post_service
+
+# timelines keep only the newest N post ids per user
+FEED_TIMELINE_CAP = int(os.getenv("FEED_TIMELINE_CAP", "800"))
+# authors with more followers are not fanned out, their followers pull at read time
+FANOUT_MAX_FOLLOWERS = int(os.getenv("FANOUT_MAX_FOLLOWERS", "10000"))
+FEED_PULL_CACHE_TTL = int(os.getenv("FEED_PULL_CACHE_TTL", "60"))
+
+
+def timeline_key(user_id: int) -> str:
+    return f"timeline:{user_id}"
+
+
+def post_score(created_at: datetime) -> float:
+    """ Timeline score: creation time in epoch milliseconds (created_at is naive UTC) """
+    return created_at.replace(tzinfo=timezone.utc).timestamp() * 1000
+
+
+# the pull query turns cursor scores back into datetimes, which cannot go past year 9999
+_MAX_SCORE = post_score(datetime(9999, 12, 31))
+
+
+def _parse_score(value) -> float:
+    score = parse_number(value)
+    if not 0 <= score <= _MAX_SCORE:
+        raise AppError("INVALID_CURSOR", "Cursor is malformed", status_code=400)
+    return score
+
+
+def _pull_authors_key(user_id: int) -> str:
+    return f"feed:pull:{user_id}"
+
+
+async def follow_user(db: AsyncSession, follower_id: int, followee_id: int) -> Optional[bool]:
+    """ True if the follow was created, False if it already existed, None if the followee does not exist """
+    if follower_id == followee_id:
+        raise AppError("INVALID_FOLLOW", "You cannot follow yourself", status_code=400)
+    if await db.get(User, followee_id) is None:
+        return None
+    if await db.get(Follow, (follower_id, followee_id)) is not None:
+        return False
+
+    db.add(Follow(follower_id=follower_id, followee_id=followee_id))
+    await db.execute(
+        update(User)
+        .where(User.id == followee_id)
+        .values(followers_count=User.followers_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        await db.commit()
+    except IntegrityError:
+        # lost a race with a concurrent follow of the same user
+        await db.rollback()
+        return False
+
+    await cache.delete_key(_pull_authors_key(follower_id))
+    return True
+
+
+async def unfollow_user(db: AsyncSession, follower_id: int, followee_id: int) -> bool:
+    result = await db.execute(
+        delete(Follow).where(Follow.follower_id == follower_id, Follow.followee_id == followee_id)
+    )
+    if result.rowcount == 0:
+        return False
+
+    await db.execute(
+        update(User)
+        .where(User.id == followee_id)
+        .values(followers_count=User.followers_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await cache.delete_key(_pull_authors_key(follower_id))
+    return True
+
+
+async def _pull_authors(db: AsyncSession, user_id: int) -> List[int]:
+    """ Followees too big to fan out, whose posts are merged in at read time """
+    return list((await db.scalars(
+        select(Follow.followee_id)
+        .join(User, User.id == Follow.followee_id)
+        .where(Follow.follower_id == user_id, User.followers_count > FANOUT_MAX_FOLLOWERS)
+    )).all())
+
+
+async def _pushed_entries(user_id: int, position: Optional[dict], limit: int) -> Set[Tuple[float, int]]:
+    """
+    Up to `limit` timeline entries ordered before the cursor by (score, id).
+    The range starts inclusively at the cursor score and filters on the id, so
+    posts sharing a score (e.g. one bulk import) are not skipped across pages.
+    """
+    key = timeline_key(user_id)
+    bound = (position["v"], position["id"]) if position else None
+    max_score = position["v"] if position else "+inf"
+    entries: Set[Tuple[float, int]] = set()
+    while True:
+        chunk = await cache.zrevrangebyscore(key, max_score, "-inf", limit)
+        if len(chunk) == limit:
+            # Redis orders equal scores by member bytes, not by id; take the whole tie group
+            lowest = chunk[-1][1]
+            chunk += await cache.zrevrangebyscore(key, lowest, lowest)
+        entries.update(
+            entry for entry in ((score, int(member)) for member, score in chunk)
+            if bound is None or entry < bound
+        )
+        if len(chunk) < limit or len(entries) >= limit:
+            return entries
+        max_score = f"({lowest}"
+
+
+def _pull_query(author_ids: List[int], position: Optional[dict], limit: int) -> Select:
+    """ Newest posts of pull authors before the cursor, as (id, created_at) """
+    stmt = select(Post.id, Post.created_at).where(Post.user_id.in_(author_ids))
+    if position:
+        before = datetime.fromtimestamp(position["v"] / 1000, tz=timezone.utc).replace(tzinfo=None)
+        stmt = stmt.where(tuple_(Post.created_at, Post.id) < tuple_(before, position["id"]))
+    return stmt.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit)
+
+
+async def read_feed(db: AsyncSession, user_id: int, cursor: Optional[str], limit: int) -> bytes:
+    """
+    Home timeline page, newest first: a ZREVRANGEBYSCORE over the precomputed
+    timeline merged with a pull of high-follower authors, then one multi-get
+    of the cached post bodies. Returns the encoded FeedPage.
+    """
+    position = decode_cursor(cursor, _parse_score) if cursor else None
+    entries = await _pushed_entries(user_id, position, limit)
+
+    pull_authors = await cache.get_or_compute(
+        _pull_authors_key(user_id),
+        lambda: _pull_authors(db, user_id),
+        FEED_PULL_CACHE_TTL,
+        # computed with the request session, never refresh in the background
+        stale_ttl=0,
+        beta=0,
+    )
+    if pull_authors:
+        rows = await db.execute(_pull_query(pull_authors, position, limit))
+        entries.update((post_score(created_at), post_id) for post_id, created_at in rows)
+
+    page = sorted(entries, reverse=True)[:limit]
+    posts = await post_service.get_posts_data(db, [post_id for _, post_id in page])
+
+    next_cursor = None
+    if len(page) == limit:
+        last_score, last_id = page[-1]
+        next_cursor = encode_cursor({"v": last_score, "id": last_id})
+
+    return orjson.dumps({
+        # cached bodies are already JSON, splice them in without re-encoding
+        "items": [orjson.Fragment(post["body"]) for post in posts if post is not None],
+        "limit": limit,
+        "next_cursor": next_cursor,
+    })
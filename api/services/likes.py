@@ -0,0 +1,67 @@
+from typing import Tuple
+
+import cache
+from errors import AppError
+
+DIRTY_POSTS_KEY = "posts:likes:dirty"
+
+# Toggle membership in the likers set and, only if it changed, move the pending
+# delta and mark the post dirty for the flush task. Returns the delta not yet
+# flushed to posts.likes. One round trip, no row locks.
+_TOGGLE_LIKE_LUA = """
+local changed
+if ARGV[3] == "1" then
+    changed = redis.call("SADD", KEYS[1], ARGV[1])
+else
+    changed = redis.call("SREM", KEYS[1], ARGV[1])
+end
+if changed == 1 then
+    redis.call("INCRBY", KEYS[2], ARGV[3])
+    redis.call("SADD", KEYS[3], ARGV[2])
+end
+return {changed, tonumber(redis.call("GET", KEYS[2]) or "0")}
+"""
+
+
+def likers_key(post_id: int) -> str:
+    return f"post:{post_id}:likers"
+
+
+def pending_key(post_id: int) -> str:
+    return f"post:{post_id}:likes:pending"
+
+
+async def _toggle(post_id: int, user_id: int, delta: int, stored_likes: int) -> Tuple[bool, int]:
+    # the toggle is a Lua script and flush_post_likes drains Redis from the
+    # workers, so an in-process backend could take likes but never persist them
+    if not isinstance(cache.get_backend(), cache.RedisBackend):
+        raise AppError(
+            "LIKES_UNAVAILABLE",
+            "Likes need the Redis cache backend (CACHE_BACKEND=redis)",
+            status_code=503,
+        )
+    changed, pending = await cache.get_redis().eval(
+        _TOGGLE_LIKE_LUA,
+        3,
+        likers_key(post_id),
+        pending_key(post_id),
+        DIRTY_POSTS_KEY,
+        user_id,
+        post_id,
+        delta,
+    )
+    return bool(changed), stored_likes + int(pending)
+
+
+async def like_post(post_id: int, user_id: int, stored_likes: int) -> Tuple[bool, int]:
+    """
+    Returns (changed, like count); liking twice is a no-op. The count is
+    posts.likes as read by the caller (`stored_likes`, the value PostOut.likes
+    reports) plus the delta still waiting for flush_post_likes, so it is what
+    PostOut.likes will show after the next flush.
+    """
+    return await _toggle(post_id, user_id, 1, stored_likes)
+
+
+async def unlike_post(post_id: int, user_id: int, stored_likes: int) -> Tuple[bool, int]:
+    return await _toggle(post_id, user_id, -1, stored_likes)
@@ -1,106 +1,582 @@
-from typing import Optional, Tuple, List
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Sequence, Tuple
 from models import Post #db 
-import json
-from fastapi.encoders import jsonable_encoder
+import cache
+import orjson
 
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, asc, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Select, asc, desc, insert, select, tuple_
 
-from schemas.posts import PostCreate, PostOut
-from redis import Redis
+import search as search_index
+from database import AsyncSessionLocal
+from errors import AppError
+from export import naive_utc
+from pagination import decode_cursor, encode_cursor, parse_datetime, parse_str
+from http_cache import make_etag
+from schemas.bulk import BulkResult
+from schemas.posts import PostBulkItem, PostCreate, PostOut
+from services import bulk
+from services import totals
+from services import users as users_service
 
-cache = Redis(host="redis", port=6379, decode_responses=True)
+# list pages are invalidated by generation bumps, so they can live for minutes
+LIST_CACHE_TTL = int(os.getenv("POSTS_LIST_CACHE_TTL", "300"))
+POST_CACHE_TTL = int(os.getenv("POST_CACHE_TTL", "600"))
+# in-process tier; pub/sub evictions keep it correct, the TTL is only a safety net
+LOCAL_CACHE_TTL = float(os.getenv("POSTS_LOCAL_CACHE_TTL", "30"))
+# totals are shared by every page, sort and limit of a listing
+TOTALS_CACHE_TTL = int(os.getenv("POSTS_TOTALS_CACHE_TTL", "600"))
 
-def list_post(
-    db: Session,
+POSTS_GEN_KEY = "posts:gen"
+# A post's generation only has to outlive every body cached under an older
+# one; once it expires the count restarts from 0 with no stale versions left.
+POST_GEN_TTL = POST_CACHE_TTL + cache.CACHE_STALE_TTL + 300
+# per-post comment counts overlaid on include=comment_count pages; comment writes evict them
+COMMENT_COUNT_CACHE_TTL = int(os.getenv("COMMENT_COUNT_CACHE_TTL", "600"))
+
+INCLUDE_OPTIONS = frozenset({"author", "comment_count"})
+
+
+def parse_include(include: Optional[str]) -> FrozenSet[str]:
+    """ `include=author,comment_count` -> frozenset, rejecting unknown names """
+    if not include:
+        return frozenset()
+    names = frozenset(name.strip() for name in include.split(",") if name.strip())
+    unknown = names - INCLUDE_OPTIONS
+    if unknown:
+        raise AppError(
+            "INVALID_INCLUDE",
+            f"Unknown include: {', '.join(sorted(unknown))}",
+            status_code=400,
+            details={"allowed": sorted(INCLUDE_OPTIONS)},
+        )
+    return names
+
+
+def _author_gen_key(author_id: int) -> str:
+    return f"posts:gen:author={author_id}"
+
+
+def post_gen_key(post_id: int) -> str:
+    return f"post:{post_id}:gen"
+
+
+def post_key(post_id: int, gen: int) -> str:
+    # versioned so a load racing a write can only repopulate an orphaned key
+    return f"post:{post_id}:v={gen}"
+
+
+async def _post_keys(post_ids: List[int]) -> List[str]:
+    gens = await cache.get_counters([post_gen_key(pid) for pid in post_ids], local_ttl=LOCAL_CACHE_TTL)
+    return [post_key(pid, gen) for pid, gen in zip(post_ids, gens)]
+
+
+async def invalidate_posts(*post_ids: int) -> None:
+    """ Move posts to a new cache version here and in every worker's local tier """
+    if not post_ids:
+        return
+    gen_keys = [post_gen_key(pid) for pid in post_ids]
+    await cache.incr(*gen_keys, ttl=POST_GEN_TTL)
+    await cache.broadcast_eviction(*gen_keys)
+
+
+async def _list_generation(author_id: Optional[int]) -> int:
+    """
+    Generation embedded in list cache keys. Author-filtered lists only follow
+    that author's generation, everything else follows the global one.
+    """
+    key = _author_gen_key(author_id) if author_id is not None else POSTS_GEN_KEY
+    (gen,) = await cache.get_counters([key], local_ttl=LOCAL_CACHE_TTL)
+    return gen
+
+
+def comment_count_key(post_id: int) -> str:
+    return f"post:{post_id}:comment_count"
+
+
+async def get_comment_counts(db: AsyncSession, post_ids: List[int]) -> Dict[int, int]:
+    """ comments_count per post: one cache multi-get, then a single IN query for the misses """
+    values = await cache.get_values([comment_count_key(pid) for pid in post_ids], local_ttl=LOCAL_CACHE_TTL)
+    counts = {pid: value for pid, value in zip(post_ids, values) if value is not None}
+    missing = [pid for pid in post_ids if pid not in counts]
+    if missing:
+        rows = await db.execute(select(Post.id, Post.comments_count).where(Post.id.in_(missing)))
+        loaded = dict(rows.all())
+        await cache.set_values({comment_count_key(pid): n for pid, n in loaded.items()}, COMMENT_COUNT_CACHE_TTL)
+        counts.update(loaded)
+    return counts
+
+
+async def invalidate_comment_count(post_id: int) -> None:
+    """ Call after comment writes on a post """
+    await cache.invalidate(comment_count_key(post_id))
+
+
+async def _with_comment_counts(db: AsyncSession, body: bytes) -> bytes:
+    """
+    Overlay current per-post comment counts on a cached page, so a comment
+    only evicts its post's count instead of every page carrying counts.
+    """
+    page = orjson.loads(body)
+    if not page["items"]:
+        return body
+    counts = await get_comment_counts(db, [item["id"] for item in page["items"]])
+    for item in page["items"]:
+        item["comment_count"] = counts.get(item["id"], item["comment_count"])
+    return orjson.dumps(page)
+
+
+async def _bump_generations(author_id: Optional[int]) -> None:
+    """ Orphan every cached list page a write to this author's post can affect """
+    keys = [POSTS_GEN_KEY]
+    if author_id is not None:
+        keys.append(_author_gen_key(author_id))
+    await cache.incr(*keys)
+    await cache.broadcast_eviction(*keys)
+
+
+async def list_post(
+    db: AsyncSession,
     *,
     page: int, 
     limit: int,
     search: Optional[str],
     sort_by: str,
     order: str,
-    author_id: Optional[int]
-) -> Tuple[List[Post], int]:
-    """ List posts with pagination and search """
+    author_id: Optional[int],
+    include: FrozenSet[str] = frozenset(),
+    exact_total: bool = True
+) -> bytes:
+    """
+    List posts with pagination and search.
+    Returns the final PaginatedPosts JSON body; it is cached as-is so hits
+    skip model validation and JSON encoding entirely.
+    With exact_total=False no total is computed at all; has_next always comes
+    from fetching one row past the page.
+    """
+    gen = await _list_generation(author_id)
     cache_key = (
-        f"posts:page={page}"
+        f"posts:gen={gen}"
+        f":page={page}"
         f":limit={limit}"
         f":search={search or ''}"
         f":sort_by={sort_by}"
         f":order={order}"
         f":author={author_id or ''}"
+        f":include={','.join(sorted(include))}"
+        f":total={int(exact_total)}"
     )
 
-    cached = cache.get(cache_key)
+    async def load(session: AsyncSession) -> bytes:
+        return await _load_page(
+            session, page=page, limit=limit, search=search,
+            sort_by=sort_by, order=order, author_id=author_id, include=include,
+            gen=gen, exact_total=exact_total,
+        )
 
-    if cached:
-        data = json.loads(cached)
-        return data["items"], data["total"]
-    
+    body = await cache.get_or_compute(
+        cache_key,
+        lambda: load(db),
+        LIST_CACHE_TTL,
+        refresh=lambda: _in_new_session(load),
+        local_ttl=LOCAL_CACHE_TTL,
+    )
+    if "comment_count" in include:
+        body = await _with_comment_counts(db, body)
+    return body
+
+
+async def _load_page(
+    db: AsyncSession,
+    *,
+    page: int,
+    limit: int,
+    search: Optional[str],
+    sort_by: str,
+    order: str,
+    author_id: Optional[int],
+    include: FrozenSet[str],
+    gen: int,
+    exact_total: bool
+) -> bytes:
     offset = (page - 1) * limit
-    query = db.query(Post)
+    stmt = await _filtered_query(db, search=search, author_id=author_id)
 
-    #filtering 
-    if search:
-        query = query.filter(
-            or_(
-                Post.title.ilike(f"%{search}%"),
-                Post.content.ilike(f"%{search}%")
-            )
-        )
+    total, estimated = None, False
+    if exact_total:
+        total, estimated = await _list_total(db, search=search, author_id=author_id, gen=gen)
 
-    if author_id is not None:
-        query = query.filter(Post.user_id == author_id)
-    
     #sorting
-    sort_column = Post.title if sort_by == "title" else Post.created_at
-    if order == "asc":
-        query = query.order_by(asc(sort_column))
+    if sort_by == "relevance" and search:
+        rank = await search_index.get_backend(db).rank(db, search)
+        stmt = stmt.order_by(desc(rank), desc(Post.id))
     else:
-        query = query.order_by(desc(sort_column))
+        stmt = _seek(stmt, position=None, sort_by=sort_by, descending=order != "asc")
     
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
+    items = (await db.scalars(stmt.offset(offset).limit(limit + 1))).all()
+    has_next = len(items) > limit
+    items = items[:limit]
+
+    items_data = await _hydrate(db, items, include)
+    return orjson.dumps({
+        "items": items_data,
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "total_estimated": estimated,
+        "has_next": has_next,
+        "has_prev": page > 1,
+        "next_cursor": None,
+        "prev_cursor": None,
+    })
+
+
+async def list_post_keyset(
+    db: AsyncSession,
+    *,
+    cursor: Optional[str],
+    page: int,
+    limit: int,
+    search: Optional[str],
+    sort_by: str,
+    order: str,
+    author_id: Optional[int],
+    include: FrozenSet[str] = frozenset()
+) -> bytes:
+    """
+    List posts by seeking on (sort column, id) instead of OFFSET.
+    Returns the encoded page with opaque cursors for the next and previous pages.
+    No COUNT is issued, so cost stays flat however deep the client scrolls.
+    """
+    if sort_by == "relevance":
+        raise AppError("UNSUPPORTED_SORT", "Cursor pagination cannot sort by relevance", status_code=400)
+
+    position = None
+    if cursor:
+        position = decode_cursor(cursor, parse_datetime if sort_by == "created_at" else parse_str)
+        if position.get("s") != sort_by or position.get("o") != order:
+            raise AppError("INVALID_CURSOR", "Cursor does not match sort_by/order", status_code=400)
+
+    gen = await _list_generation(author_id)
+    cache_key = (
+        f"posts:gen={gen}"
+        f":cursor={cursor or ''}"
+        f":page={page}"
+        f":limit={limit}"
+        f":search={search or ''}"
+        f":sort_by={sort_by}"
+        f":order={order}"
+        f":author={author_id or ''}"
+        f":include={','.join(sorted(include))}"
+    )
+
+    async def load(session: AsyncSession) -> bytes:
+        return await _load_keyset_page(
+            session, position=position, page=page, limit=limit, search=search,
+            sort_by=sort_by, order=order, author_id=author_id, include=include,
+        )
+
+    body = await cache.get_or_compute(
+        cache_key,
+        lambda: load(db),
+        LIST_CACHE_TTL,
+        refresh=lambda: _in_new_session(load),
+        local_ttl=LOCAL_CACHE_TTL,
+    )
+    if "comment_count" in include:
+        body = await _with_comment_counts(db, body)
+    return body
+
+
+async def _load_keyset_page(
+    db: AsyncSession,
+    *,
+    position: Optional[dict],
+    page: int,
+    limit: int,
+    search: Optional[str],
+    sort_by: str,
+    order: str,
+    author_id: Optional[int],
+    include: FrozenSet[str]
+) -> bytes:
+    backward = bool(position and position.get("b"))
+
+    # walking backwards is the same seek with the comparison and ordering flipped
+    descending = (order == "desc") != backward
+
+    stmt = await _filtered_query(db, search=search, author_id=author_id)
+    stmt = _seek(stmt, position=position, sort_by=sort_by, descending=descending).limit(limit + 1)
+    rows = list((await db.scalars(stmt)).all())
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if has_more or backward:
+            next_cursor = _cursor_for(rows[-1], sort_by, order, backward=False)
+        if (has_more and backward) or (position is not None and not backward):
+            prev_cursor = _cursor_for(rows[0], sort_by, order, backward=True)
 
-    items_data = [
-        PostOut.model_validate(post, from_attributes=True).model_dump()
-        for post in items
+    items_data = await _hydrate(db, rows, include)
+    return orjson.dumps({
+        "items": items_data,
+        "page": page,
+        "limit": limit,
+        "total": None,
+        "total_estimated": False,
+        "has_next": next_cursor is not None,
+        "has_prev": prev_cursor is not None,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    })
+
+
+def _seek(stmt: Select, *, position: Optional[dict], sort_by: str, descending: bool) -> Select:
+    """
+    Order a listing by (sort column, id), past the cursor position if given.
+    Offset pages use it too, so both modes are served by the same
+    (created_at, id) and (title, id) indexes.
+    """
+    sort_column = Post.title if sort_by == "title" else Post.created_at
+    if position is not None:
+        key = tuple_(sort_column, Post.id)
+        bound = tuple_(position["v"], position["id"])
+        stmt = stmt.where(key < bound if descending else key > bound)
+
+    direction = desc if descending else asc
+    return stmt.order_by(direction(sort_column), direction(Post.id))
+
+
+async def _list_total(
+    db: AsyncSession, *, search: Optional[str], author_id: Optional[int], gen: int
+) -> Tuple[int, bool]:
+    """
+    (total, is_estimate) for a listing, cached apart from the pages. Unfiltered
+    and per-author totals come from the maintained counters; search totals are
+    planner estimates.
+    """
+    cache_key = f"posts:total:gen={gen}:search={search or ''}:author={author_id or ''}"
+
+    async def load(session: AsyncSession) -> list:
+        if not search:
+            return [await totals.post_count(session, author_id), False]
+        stmt = await _filtered_query(session, search=search, author_id=author_id)
+        return list(await totals.estimate_count(session, stmt))
+
+    total, estimated = await cache.get_or_compute(
+        cache_key,
+        lambda: load(db),
+        TOTALS_CACHE_TTL,
+        refresh=lambda: _in_new_session(load),
+        local_ttl=LOCAL_CACHE_TTL,
+    )
+    return total, estimated
+
+
+async def _hydrate(db: AsyncSession, posts: Sequence[Post], include: FrozenSet[str]) -> List[dict]:
+    """
+    Serialize a page of posts plus the requested relations in a constant number
+    of statements: authors via one cached IN lookup, comment counts from the
+    denormalized posts.comments_count column (replaced on every read by the
+    per-post cached counts, see _with_comment_counts).
+    """
+    items = [
+        PostOut.model_validate(post, from_attributes=True).model_dump(mode="json")
+        for post in posts
     ]
-    payload = jsonable_encoder({"items": items_data, "total": total})
-    cache.set(cache_key, json.dumps(payload), ex=60)
+    if "author" in include:
+        authors = await users_service.get_authors(
+            db, (post.user_id for post in posts if post.user_id is not None)
+        )
+        for item, post in zip(items, posts):
+            item["author"] = authors.get(post.user_id)
+    if "comment_count" in include:
+        for item, post in zip(items, posts):
+            item["comment_count"] = post.comments_count
+    return items
 
-    return items_data, total
 
-def get_post(db: Session, post_id: int) -> Optional[Post]:
-    return db.query(Post).filter(Post.id == post_id).first()
+async def _in_new_session(fn):
+    """ Background refreshes outlive the request, so they get their own session """
+    async with AsyncSessionLocal() as session:
+        return await fn(session)
 
-def create_post(db: Session, *, user_id: int, data: PostCreate) -> Optional[Post]:
+
+async def _filtered_query(db: AsyncSession, *, search: Optional[str], author_id: Optional[int]) -> Select:
+    stmt = select(Post)
+
+    #filtering 
+    if search:
+        stmt = await search_index.get_backend(db).apply(db, stmt, search)
+
+    if author_id is not None:
+        stmt = stmt.where(Post.user_id == author_id)
+    return stmt
+
+
+def _cursor_for(post: Post, sort_by: str, order: str, *, backward: bool) -> str:
+    value = post.title if sort_by == "title" else post.created_at
+    return encode_cursor({"s": sort_by, "o": order, "v": value, "id": post.id, "b": backward})
+
+async def get_post(db: AsyncSession, post_id: int) -> Optional[Post]:
+    return await db.get(Post, post_id)
+
+
+async def get_post_data(db: AsyncSession, post_id: int) -> Optional[dict]:
+    """
+    Encoded post for reads, served from the local tier, then Redis, then the DB.
+    Returns {"body", "etag", "updated_at"}: the JSON body is encoded once per
+    version of the post and reused for every hit and conditional request.
+    """
+
+    async def load(session: AsyncSession) -> Optional[dict]:
+        post = await get_post(session, post_id)
+        if post is None:
+            return None
+        return _encode_post(post)
+
+    (key,) = await _post_keys([post_id])
+    return await cache.get_or_compute(
+        key,
+        lambda: load(db),
+        POST_CACHE_TTL,
+        refresh=lambda: _in_new_session(load),
+        local_ttl=LOCAL_CACHE_TTL,
+    )
+
+
+async def get_posts_data(db: AsyncSession, post_ids: List[int]) -> List[Optional[dict]]:
+    """
+    Batch form of get_post_data: one cache multi-get, then a single IN query
+    for whatever missed. Missing posts come back as None.
+    """
+    keys = await _post_keys(post_ids)
+    values = await cache.get_values(keys, local_ttl=LOCAL_CACHE_TTL)
+    missing = [pid for pid, value in zip(post_ids, values) if value is None]
+    if not missing:
+        return values
+
+    rows = (await db.scalars(select(Post).where(Post.id.in_(missing)))).all()
+    loaded = {post.id: _encode_post(post) for post in rows}
+    await cache.set_values(
+        {key: loaded[pid] for pid, key in zip(post_ids, keys) if pid in loaded}, POST_CACHE_TTL
+    )
+    return [value if value is not None else loaded.get(pid) for pid, value in zip(post_ids, values)]
+
+
+def _encode_post(post: Post) -> dict:
+    body = orjson.dumps(PostOut.model_validate(post, from_attributes=True).model_dump(mode="json"))
+    return {
+        "body": body.decode(),
+        "etag": make_etag(body),
+        "updated_at": post.updated_at.isoformat(),
+    }
+
+async def create_post(db: AsyncSession, *, user_id: int, data: PostCreate) -> Optional[Post]:
     new_post = Post(
         title=data.title,
         content=data.content,
         user_id=user_id
     )
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    await totals.adjust_post_counts(db, user_id, 1)
+    await db.commit()
+    await db.refresh(new_post)
+    await search_index.index_post(db, new_post)
+    await _bump_generations(new_post.user_id)
+    await invalidate_posts(new_post.id)
     return new_post
 
-def update_post(db: Session, *, post_id: int, data: PostCreate) -> Optional[Post]:
-    post = get_post(db, post_id)
+EXPORT_FIELDS = ("id", "user_id", "title", "content", "likes", "comments_count", "created_at", "updated_at")
+
+
+def export_posts_query(
+    *,
+    author_id: Optional[int],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+) -> Select:
+    """ Plain column select in primary key order, for streaming exports """
+    created_after, created_before = naive_utc(created_after), naive_utc(created_before)
+    stmt = select(*(getattr(Post, field) for field in EXPORT_FIELDS))
+    if author_id is not None:
+        stmt = stmt.where(Post.user_id == author_id)
+    if created_after is not None:
+        stmt = stmt.where(Post.created_at >= created_after)
+    if created_before is not None:
+        stmt = stmt.where(Post.created_at < created_before)
+    return stmt.order_by(Post.id)
+
+
+async def bulk_create_posts(
+    db: AsyncSession, *, user_id: int, chunks: AsyncIterator[bytes], batch_size: int = bulk.BULK_BATCH_SIZE
+) -> BulkResult:
+    """
+    NDJSON import: one INSERT ... RETURNING per batch instead of an
+    insert/commit/refresh round trip per post. List caches are bumped after
+    each committed batch, so an upload aborted midway still shows the rows that
+    landed. Imports do not notify or fan out, that is for live posts.
+    """
+    now = datetime.utcnow()
+
+    def to_row(item: PostBulkItem) -> dict:
+        created_at = item.created_at or now
+        return {
+            "title": item.title,
+            "content": item.content,
+            "user_id": user_id,
+            "created_at": created_at,
+            "updated_at": created_at,
+            "likes": 0,
+            "is_published": True,
+        }
+
+    async def write(rows: List[dict]) -> Sequence[Post]:
+        posts = (await db.scalars(insert(Post).returning(Post), rows)).all()
+        await totals.adjust_post_counts(db, user_id, len(posts))
+        return posts
+
+    async def after(posts: Sequence[Post]) -> None:
+        await search_index.index_post(db, *posts)
+        # new ids may have a cached miss from an earlier probe
+        await invalidate_posts(*(post.id for post in posts))
+        await _bump_generations(user_id)
+
+    return await bulk.ingest(
+        db, chunks, schema=PostBulkItem, to_row=to_row, write=write, after=after, batch_size=batch_size
+    )
+
+async def update_post(db: AsyncSession, *, post_id: int, data: PostCreate) -> Optional[Post]:
+    post = await get_post(db, post_id)
     if post is None:
         return None
 
     post.title = data.title
     post.content = data.content
-    db.commit()
-    db.refresh(post)
+    post.updated_at = datetime.utcnow()
+    await db.commit()
+    await db.refresh(post)
+    await search_index.index_post(db, post)
+    await _bump_generations(post.user_id)
+    await invalidate_posts(post_id)
     return post
 
-def delete_post(db: Session, *, post_id: int) -> bool:
-    post = get_post(db, post_id)
+async def delete_post(db: AsyncSession, *, post_id: int) -> bool:
+    post = await get_post(db, post_id)
     if post is None:
         return False
 
-    db.delete(post)
-    db.commit()
+    author_id = post.user_id
+    await db.delete(post)
+    await totals.adjust_post_counts(db, author_id, -1)
+    await db.commit()
+    await search_index.remove_post(db, post_id)
+    await _bump_generations(author_id)
+    await invalidate_posts(post_id)
     return True
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+from typing import Optional, Tuple
+
+import orjson
+from sqlalchemy import Select, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from logging_config import get_logger
+from models import Post, RowCount, User
+
+logger = get_logger("services.totals")
+
+POSTS_COUNTER = "posts"
+# planner estimates below this are too unreliable to show, counting that few rows is cheap
+TOTALS_EXACT_BELOW = int(os.getenv("TOTALS_EXACT_BELOW", "1000"))
+
+
+async def adjust_post_counts(db: AsyncSession, author_id: Optional[int], delta: int) -> None:
+    """
+    Move the global and per-author post counters by delta. Runs in the caller's
+    transaction, so the counters commit or roll back together with the posts.
+    """
+    await db.execute(
+        update(RowCount)
+        .where(RowCount.name == POSTS_COUNTER)
+        .values(count=RowCount.count + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if author_id is not None:
+        await db.execute(
+            update(User)
+            .where(User.id == author_id)
+            .values(posts_count=User.posts_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def post_count(db: AsyncSession, author_id: Optional[int]) -> int:
+    """ Exact total from the maintained counters, a single primary key lookup """
+    if author_id is not None:
+        return await db.scalar(select(User.posts_count).where(User.id == author_id)) or 0
+
+    total = await db.scalar(select(RowCount.count).where(RowCount.name == POSTS_COUNTER))
+    if total is None:
+        logger.warning("Missing row_counts entry %s, falling back to COUNT(*)", POSTS_COUNTER)
+        total = await db.scalar(select(func.count()).select_from(Post))
+    return total
+
+
+async def estimate_count(db: AsyncSession, stmt: Select) -> Tuple[int, bool]:
+    """
+    Row count for an arbitrary filtered query, returned with an is-estimate flag.
+    On Postgres the planner's row estimate (EXPLAIN, which works from
+    pg_class.reltuples and column statistics) is used instead of running the
+    query; small estimates are replaced by an exact count. Other databases
+    count exactly.
+    """
+    if db.bind.dialect.name == "postgresql":
+        sql = stmt.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+        plan = await db.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        if isinstance(plan, (str, bytes)):
+            plan = orjson.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate >= TOTALS_EXACT_BELOW:
+            return estimate, True
+
+    total = await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    return total, False
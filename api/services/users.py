@@ -1,119 +1,256 @@
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
-import logging
+import hashlib
+import os
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+import cache
+from database import get_async_db
 from models import User
-from schemas.users import UserLogin, UserSignup
+from schemas.users import UserLogin, UserOut, UserSignup
 from auth import (
     SECRET_KEY,      # use the same as auth.py
     ALGORITHM,       # use the same as auth.py
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_and_update_async,
+    dummy_verify,
     create_access_token,
 )
+from errors import AppError
+from logging_config import get_logger
+from throttle import SlidingWindowLimiter
 
-logger = logging.getLogger(__name__)
+logger = get_logger("services.users")
 
 # This matches the /login path in your router
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+AUTH_PRINCIPAL_CACHE_TTL = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))
+AUTH_TOKEN_CACHE_MAX_ITEMS = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ITEMS", "50000"))
 
-def get_user_by_identifier(db: Session, identifier: str) -> Optional[User]:
+_verified_tokens = cache.LocalCache(AUTH_TOKEN_CACHE_MAX_ITEMS, AUTH_TOKEN_CACHE_MAX_ITEMS * 64)
+
+# failed attempts per identifier, any attempt per client IP
+_identifier_failures = SlidingWindowLimiter(
+    "login:identifier",
+    limit=int(os.getenv("LOGIN_MAX_FAILURES_PER_IDENTIFIER", "5")),
+    window_seconds=int(os.getenv("LOGIN_IDENTIFIER_WINDOW", "300")),
+)
+_ip_attempts = SlidingWindowLimiter(
+    "login:ip",
+    limit=int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", "30")),
+    window_seconds=int(os.getenv("LOGIN_IP_WINDOW", "60")),
+)
+LOGIN_UNKNOWN_CACHE_TTL = int(os.getenv("LOGIN_UNKNOWN_CACHE_TTL", "60"))
+AUTHOR_CACHE_TTL = int(os.getenv("AUTHOR_CACHE_TTL", "3600"))
+AUTHOR_LOCAL_CACHE_TTL = float(os.getenv("AUTHOR_LOCAL_CACHE_TTL", "60"))
+
+
+def _identifier_hash(identifier: str) -> str:
+    return hashlib.sha256(identifier.strip().lower().encode()).hexdigest()
+
+
+def _unknown_identifier_key(identifier: str) -> str:
+    return f"login:unknown:{hashlib.sha256(identifier.encode()).hexdigest()}"
+
+
+async def get_user_by_identifier(db: AsyncSession, identifier: str) -> Optional[User]:
     """
     Find user by username OR email.
     """
-    return (
-        db.query(User)
-        .filter((User.username == identifier) | (User.email == identifier))
-        .first()
+    return await db.scalar(
+        select(User)
+        .where((User.username == identifier) | (User.email == identifier))
+        .limit(1)
     )
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
+def _principal_key(user_id: int) -> str:
+    return f"user:{user_id}:principal"
+
+
+def _decode_token(token: str) -> int:
     """
-    Extract current user from JWT Bearer token.
-    Used as a dependency in protected routes.
+    Verify the JWT and return its user id. Verified tokens are remembered by
+    hash until they expire (capped at AUTH_TOKEN_CACHE_TTL), so repeat requests
+    skip signature verification.
     """
-    logger.info("INFO: Incoming token: %s", token)
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    hit, user_id = _verified_tokens.get(token_key)
+    if hit:
+        return user_id
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        logger.info("INFO: Decoded JWT payload: %s", payload)
     except JWTError as e:
-        logger.error("ERROR: JWT decode error: %s", e)
+        logger.warning("JWT decode error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
 
-    user_id = payload.get("sub")
-    logger.info("INFO: Extracted user_id from token: %s", user_id)
-
-    if user_id is None:
-        logger.error("ERROR: No 'sub' claim in token")
+    sub = payload.get("sub")
+    if sub is None:
+        logger.warning("No 'sub' claim in token")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload",
         )
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    logger.info("INFO: Loaded user from DB: %s", user)
+    user_id = int(sub)
+    exp = payload.get("exp")
+    ttl = AUTH_TOKEN_CACHE_TTL if exp is None else min(AUTH_TOKEN_CACHE_TTL, exp - time.time())
+    _verified_tokens.set(token_key, user_id, 64, ttl)
+    return user_id
 
-    if user is None:
-        logger.error("ERROR: User not found in DB")
+
+def _author_key(user_id: int) -> str:
+    return f"user:{user_id}:author"
+
+
+async def get_authors(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Public author fields for a set of users: one cache multi-get, then a
+    single IN query for the misses. Unknown ids are left out.
+    """
+    ids = sorted(set(user_ids))
+    if not ids:
+        return {}
+
+    cached = await cache.get_values([_author_key(uid) for uid in ids], local_ttl=AUTHOR_LOCAL_CACHE_TTL)
+    authors = {uid: author for uid, author in zip(ids, cached) if author is not None}
+    missing = [uid for uid in ids if uid not in authors]
+    if missing:
+        rows = await db.execute(select(User.id, User.username).where(User.id.in_(missing)))
+        loaded = {uid: {"id": uid, "username": username} for uid, username in rows}
+        await cache.set_values({_author_key(uid): author for uid, author in loaded.items()}, AUTHOR_CACHE_TTL)
+        authors.update(loaded)
+    return authors
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> UserOut:
+    """
+    Extract current user from JWT Bearer token.
+    Used as a dependency in protected routes.
+    On the hot path this is a local token-cache hit plus a principal-cache hit,
+    with no database query.
+    """
+    user_id = _decode_token(token)
+
+    async def load() -> Optional[dict]:
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+        return {"id": user.id, "username": user.username, "email": user.email}
+
+    principal = await cache.get_or_compute(
+        _principal_key(user_id),
+        load,
+        AUTH_PRINCIPAL_CACHE_TTL,
+        # load uses the request session, so never refresh it in the background
+        stale_ttl=0,
+        beta=0,
+        local_ttl=AUTH_PRINCIPAL_CACHE_TTL,
+    )
+
+    if principal is None:
+        logger.warning("User %s from token not found", user_id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
 
-    return user
+    # cached data was validated when it was written
+    return UserOut.model_construct(**principal)
+
 
+async def invalidate_user_cache(user_id: int) -> None:
+    """ Call after any change to a user row so every worker drops the principal """
+    await cache.invalidate(_principal_key(user_id), _author_key(user_id))
 
-def is_existing_user(db: Session, user: UserSignup) -> bool:
+
+async def is_existing_user(db: AsyncSession, user: UserSignup) -> bool:
     return (
-        db.query(User)
-        .filter((User.username == user.username) | (User.email == user.email))
-        .first()
+        await db.scalar(
+            select(User.id)
+            .where((User.username == user.username) | (User.email == user.email))
+            .limit(1)
+        )
         is not None
     )
 
 
-def signup_user(db: Session, user: UserSignup) -> User:
-    hashed_password = hash_password(user.password)
+async def signup_user(db: AsyncSession, user: UserSignup) -> User:
+    # bcrypt is CPU bound, it runs in the bounded password pool
+    hashed_password = await hash_password_async(user.password)
     new_user = User(
         username=user.username,
         email=user.email,
         password_hash=hashed_password,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    # a token minted for this id before it existed may have cached a miss
+    await invalidate_user_cache(new_user.id)
+    await cache.delete_key(
+        _unknown_identifier_key(new_user.username),
+        _unknown_identifier_key(new_user.email),
+    )
     return new_user
 
 
-def login_user(db: Session, form_data: OAuth2PasswordRequestForm) -> Optional[User]:
+async def login_user(
+    db: AsyncSession, form_data: OAuth2PasswordRequestForm, client_ip: Optional[str] = None
+) -> Optional[User]:
     """
     Validate username/email + password. Return User if OK, else None.
+    Throttled callers are rejected with 429 before any DB or bcrypt work.
     """
     identifier = form_data.username  # can be email or username
     password = form_data.password
+    identifier_hash = _identifier_hash(identifier)
+
+    if (client_ip and await _ip_attempts.is_blocked(client_ip)) or await _identifier_failures.is_blocked(identifier_hash):
+        logger.warning("Login throttled for user %s", identifier)
+        raise AppError("TOO_MANY_ATTEMPTS", "Too many login attempts, try again later", status_code=429)
+    if client_ip:
+        await _ip_attempts.record(client_ip)
+
+    unknown_key = _unknown_identifier_key(identifier)
+    user = None
+    if await cache.get(unknown_key) is None:
+        user = await get_user_by_identifier(db, identifier)
+        if user is None:
+            await cache.set(unknown_key, 1, ttl=LOGIN_UNKNOWN_CACHE_TTL)
 
-    user = get_user_by_identifier(db, identifier)
     if user is None:
+        await dummy_verify()
+        await _identifier_failures.record(identifier_hash)
         logger.info("Login failed: user %s not found", identifier)
         return None
 
-    if not verify_password(password, user.password_hash):
+    verified, new_hash = await verify_and_update_async(password, user.password_hash)
+    if not verified:
+        await _identifier_failures.record(identifier_hash)
         logger.info("Login failed: invalid password for user %s", identifier)
         return None
 
+    await _identifier_failures.reset(identifier_hash)
+
+    if new_hash is not None:
+        # stored hash predates the current BCRYPT_ROUNDS, upgrade it while we have the password
+        user.password_hash = new_hash
+        await db.commit()
+
     logger.info("Login successful for user %s", identifier)
     return user
\ No newline at end of file
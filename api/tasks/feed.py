@@ -0,0 +1,90 @@
+import os
+
+from sqlalchemy import select
+
+from celery_app import celery_app, redis_client
+from database import SessionLocal
+from logging_config import get_logger
+from models import Follow, Post, User
+from services.feed import FANOUT_MAX_FOLLOWERS, FEED_TIMELINE_CAP, post_score, timeline_key
+
+logger = get_logger("tasks.feed")
+
+FANOUT_BATCH = int(os.getenv("FANOUT_BATCH", "1000"))
+FEED_BACKFILL_POSTS = int(os.getenv("FEED_BACKFILL_POSTS", "50"))
+
+
+def _push(pipe, user_id: int, entries: dict) -> None:
+    key = timeline_key(user_id)
+    pipe.zadd(key, entries)
+    pipe.zremrangebyrank(key, 0, -(FEED_TIMELINE_CAP + 1))
+
+
+@celery_app.task
+def fan_out_post(post_id: int, author_id: int, score: float):
+    """ Push a new post id into the timeline of the author and every follower """
+    with SessionLocal() as db:
+        followers_count = db.scalar(select(User.followers_count).where(User.id == author_id))
+        if followers_count is None:
+            return {"status": "skipped", "post_id": post_id}
+
+        with redis_client.pipeline(transaction=False) as pipe:
+            _push(pipe, author_id, {post_id: score})
+            pipe.execute()
+
+        if followers_count > FANOUT_MAX_FOLLOWERS:
+            # followers merge this author's posts in at read time
+            return {"status": "pull", "post_id": post_id}
+
+        pushed = 0
+        result = db.execute(
+            select(Follow.follower_id)
+            .where(Follow.followee_id == author_id)
+            .execution_options(yield_per=FANOUT_BATCH)
+        )
+        for partition in result.partitions():
+            with redis_client.pipeline(transaction=False) as pipe:
+                for (follower_id,) in partition:
+                    _push(pipe, follower_id, {post_id: score})
+                pipe.execute()
+            pushed += len(partition)
+
+    logger.info("Fanned out post %s to %d followers", post_id, pushed)
+    return {"status": "ok", "post_id": post_id, "followers": pushed}
+
+
+@celery_app.task
+def backfill_timeline(follower_id: int, followee_id: int):
+    """ Seed a new follower's timeline with the followee's recent posts """
+    with SessionLocal() as db:
+        followers_count = db.scalar(select(User.followers_count).where(User.id == followee_id))
+        if followers_count is None or followers_count > FANOUT_MAX_FOLLOWERS:
+            return {"status": "skipped"}
+        rows = db.execute(
+            select(Post.id, Post.created_at)
+            .where(Post.user_id == followee_id)
+            .order_by(Post.created_at.desc())
+            .limit(FEED_BACKFILL_POSTS)
+        ).all()
+
+    if rows:
+        with redis_client.pipeline(transaction=False) as pipe:
+            _push(pipe, follower_id, {post_id: post_score(created_at) for post_id, created_at in rows})
+            pipe.execute()
+    return {"status": "ok", "posts": len(rows)}
+
+
+@celery_app.task
+def prune_timeline(follower_id: int, followee_id: int):
+    """ Drop an unfollowed author's posts from the follower's timeline """
+    with SessionLocal() as db:
+        post_ids = db.scalars(
+            select(Post.id)
+            .where(Post.user_id == followee_id)
+            .order_by(Post.created_at.desc())
+            .limit(FEED_TIMELINE_CAP)
+        ).all()
+
+    if post_ids:
+        redis_client.zrem(timeline_key(follower_id), *post_ids)
+    return {"status": "ok", "posts": len(post_ids)}
@@ -0,0 +1,77 @@
+import os
+
+import orjson
+from sqlalchemy import bindparam, update
+
+from cache import INVALIDATION_CHANNEL
+from celery_app import celery_app, redis_client
+from database import SessionLocal
+from logging_config import get_logger
+from models import Post
+from services.likes import DIRTY_POSTS_KEY, pending_key
+from services.posts import POST_GEN_TTL, post_gen_key
+
+logger = get_logger("tasks.likes")
+
+LIKES_FLUSH_BATCH = int(os.getenv("LIKES_FLUSH_BATCH", "1000"))
+
+
+@celery_app.task
+def flush_post_likes():
+    """
+    Write-behind: move pending like deltas from Redis into posts.likes,
+    one executemany UPDATE per batch of dirty posts.
+    """
+    flushed = 0
+    while True:
+        post_ids = [int(pid) for pid in redis_client.spop(DIRTY_POSTS_KEY, LIKES_FLUSH_BATCH) or []]
+        if not post_ids:
+            break
+
+        with redis_client.pipeline(transaction=False) as pipe:
+            for post_id in post_ids:
+                pipe.getdel(pending_key(post_id))
+            deltas = pipe.execute()
+
+        rows = [
+            {"pid": post_id, "delta": int(delta)}
+            for post_id, delta in zip(post_ids, deltas)
+            if delta is not None and int(delta) != 0
+        ]
+        if not rows:
+            continue
+
+        try:
+            with SessionLocal() as db:
+                # on the Connection this is a plain Core executemany; Session.execute
+                # would treat a list of rows as an ORM bulk UPDATE keyed by posts.id
+                db.connection().execute(
+                    update(Post)
+                    .where(Post.id == bindparam("pid"))
+                    .values(likes=Post.likes + bindparam("delta")),
+                    rows,
+                )
+                db.commit()
+        except Exception:
+            # put the deltas back so the next run retries them
+            with redis_client.pipeline(transaction=False) as pipe:
+                for row in rows:
+                    pipe.incrby(pending_key(row["pid"]), row["delta"])
+                    pipe.sadd(DIRTY_POSTS_KEY, row["pid"])
+                pipe.execute()
+            logger.exception("Failed to flush likes for %d posts", len(rows))
+            raise
+
+        # cached post bodies carry the like count, move them to a new version in every API worker
+        gen_keys = [post_gen_key(row["pid"]) for row in rows]
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key in gen_keys:
+                pipe.incr(key)
+                pipe.expire(key, POST_GEN_TTL)
+            pipe.publish(INVALIDATION_CHANNEL, orjson.dumps(gen_keys))
+            pipe.execute()
+        flushed += len(rows)
+
+    if flushed:
+        logger.info("Flushed likes for %d posts", flushed)
+    return {"status": "ok", "posts": flushed}
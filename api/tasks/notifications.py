@@ -8,9 +8,9 @@ logger = get_logger("tasks.notificarions")
 
 @celery_app.task
 def send_new_post_notification(post_id: int, title: str):
-    logger.info(f"[celery] Starting notification tasks for post_id = {post_id}")
+    logger.info("[celery] Starting notification tasks for post_id = %s", post_id, extra={"post_id": post_id})
     time.sleep(2)
-    logger.info(f"[celery] Finished sending notification tasks for post_id = {post_id}")
+    logger.info("[celery] Finished sending notification tasks for post_id = %s", post_id, extra={"post_id": post_id})
     return {"status": "ok", "post_id": post_id}
 
 
@@ -21,11 +21,11 @@ def send_new_post_notification(post_id: int, title: str):
 #     retry_kwargs={"max_retries": 3},
 # )
 # def send_new_post_notification(post_id: int, user_id: int):
-#     logger.info(f"[celery] Starting notification tasks for post_id = {post_id}")
+#     logger.info("[celery] Starting notification tasks for post_id = %s", post_id, extra={"post_id": post_id})
 
 #     if random.random() < 0.5:
 #         logger.error("[celery] Simulated failure for post_id=%s", post_id)
 #         raise RuntimeError("Simulated notification failure")
 
-#     logger.info(f"[celery] Finished sending notification tasks for post_id = {post_id}")
+#     logger.info("[celery] Finished sending notification tasks for post_id = %s", post_id, extra={"post_id": post_id})
 #     return {"status": "ok", "post_id": post_id}
\ No newline at end of file
@@ -0,0 +1,45 @@
+import os
+import tempfile
+
+# configure before the app modules create their engines and cache backend
+_db_dir = tempfile.mkdtemp(prefix="micro-blog-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("SERVER_TIMING", "false")
+
+import pytest
+
+import cache
+from database import Base, engine
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(engine)
+    yield
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.set_backend(cache.MemoryBackend())
+    cache.local.clear()
+    yield
+
+
+@pytest.fixture
+def client():
+    """ The app without startup hooks; the per-route limiter needs Redis, so it is switched off """
+    from fastapi.testclient import TestClient
+    from fastapi_limiter.depends import RateLimiter
+
+    import main
+    from routers import comments, feed, posts, users
+
+    for router in (posts.router, users.router, comments.router, feed.router):
+        for dependency in (d for route in router.routes for d in getattr(route, "dependencies", ())):
+            if isinstance(dependency.dependency, RateLimiter):
+                main.app.dependency_overrides[dependency.dependency] = lambda: None
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
@@ -0,0 +1,10 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_app_imports_and_serves():
+    client = TestClient(main.app)
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, func, select
+
+import cache
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from errors import AppError
+from models import Comments, Post, User
+from services import bulk
+from services import comments as comments_service
+from services import posts as post_service
+
+
+@pytest.fixture
+def author(schema):
+    with SessionLocal() as db:
+        user = User(username="bulk-author", email="bulk-author@example.com", password_hash="!")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    yield user_id
+    with SessionLocal() as db:
+        db.execute(delete(Comments))
+        db.execute(delete(Post))
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+
+
+@pytest.fixture(autouse=True)
+def short_lines(monkeypatch):
+    monkeypatch.setattr(bulk, "BULK_MAX_LINE_BYTES", 256)
+
+
+async def _upload_cut_short(*lines: bytes):
+    """ The given lines, then one that is too long, as the body of a dropped upload """
+    for line in lines:
+        yield line + b"\n"
+    yield b"x" * 512
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro()
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+def test_aborted_post_import_invalidates_committed_batches(author):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            before = await cache.get_counters([post_service.POSTS_GEN_KEY])
+            with pytest.raises(AppError) as exc:
+                await post_service.bulk_create_posts(
+                    db,
+                    user_id=author,
+                    chunks=_upload_cut_short(b'{"title": "one", "content": "c"}', b'{"title": "two", "content": "c"}'),
+                    batch_size=1,
+                )
+            after = await cache.get_counters([post_service.POSTS_GEN_KEY])
+            inserted = await db.scalar(select(func.count()).select_from(Post).where(Post.user_id == author))
+            return before, after, exc.value, inserted
+
+    before, after, error, inserted = run(scenario)
+
+    assert error.status_code == 413
+    assert inserted == 2
+    assert after[0] > before[0]
+
+
+def test_aborted_comment_import_evicts_cached_count(author):
+    with SessionLocal() as db:
+        post = Post(title="post", content="content", user_id=author)
+        db.add(post)
+        db.commit()
+        post_id = post.id
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            cached = await post_service.get_comment_counts(db, [post_id])
+            with pytest.raises(AppError):
+                await comments_service.bulk_create_comments(
+                    db, post_id, author, _upload_cut_short(b'{"content": "a"}', b'{"content": "b"}'), batch_size=1
+                )
+            return cached, await post_service.get_comment_counts(db, [post_id])
+
+    cached, fresh = run(scenario)
+
+    assert cached == {post_id: 0}
+    assert fresh == {post_id: 2}
@@ -0,0 +1,48 @@
+import fakeredis
+import pytest
+from sqlalchemy import select
+
+from database import SessionLocal
+from models import Post
+from services.likes import DIRTY_POSTS_KEY, pending_key
+from services.posts import post_gen_key
+from tasks import likes as likes_tasks
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(likes_tasks, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def post_ids():
+    with SessionLocal() as db:
+        posts = [Post(title=f"liked {i}", content="content", likes=3) for i in range(2)]
+        db.add_all(posts)
+        db.commit()
+        ids = [post.id for post in posts]
+    yield ids
+    with SessionLocal() as db:
+        for post_id in ids:
+            db.delete(db.get(Post, post_id))
+        db.commit()
+
+
+def test_flush_writes_pending_deltas_to_posts(redis_client, post_ids):
+    first, second = post_ids
+    redis_client.set(pending_key(first), 2)
+    redis_client.set(pending_key(second), -1)
+    redis_client.sadd(DIRTY_POSTS_KEY, first, second)
+
+    result = likes_tasks.flush_post_likes()
+
+    assert result == {"status": "ok", "posts": 2}
+    with SessionLocal() as db:
+        likes = dict(db.execute(select(Post.id, Post.likes).where(Post.id.in_(post_ids))).all())
+    assert likes == {first: 5, second: 2}
+    # nothing left to flush, and cached bodies moved to a new version
+    assert redis_client.scard(DIRTY_POSTS_KEY) == 0
+    assert redis_client.get(pending_key(first)) is None
+    assert int(redis_client.get(post_gen_key(first))) == 1
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from errors import AppError
+from pagination import decode_cursor, encode_cursor, parse_datetime, parse_number, parse_str
+
+
+def test_round_trip_parses_value():
+    created_at = datetime(2024, 5, 1, 12, 30)
+    position = decode_cursor(encode_cursor({"v": created_at, "id": 7, "b": True}), parse_datetime)
+    assert position == {"v": created_at, "id": 7, "b": True}
+
+
+@pytest.mark.parametrize("payload, parse_value", [
+    ({"v": "2024-05-01T12:30:00", "id": "7"}, parse_datetime),
+    ({"v": "2024-05-01T12:30:00", "id": 7.5}, parse_datetime),
+    ({"v": "2024-05-01T12:30:00", "id": True}, parse_datetime),
+    ({"v": 1714566600000, "id": 7}, parse_datetime),
+    ({"v": "yesterday", "id": 7}, parse_datetime),
+    ({"v": ["a"], "id": 7}, parse_str),
+    ({"v": "1714566600000", "id": 7}, parse_number),
+    ({"v": False, "id": 7}, parse_number),
+    ({"v": "title"}, parse_str),
+])
+def test_rejects_values_of_the_wrong_type(payload, parse_value):
+    with pytest.raises(AppError) as exc:
+        decode_cursor(encode_cursor(payload), parse_value)
+    assert exc.value.code == "INVALID_CURSOR"
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.parametrize("v, id_", [(12345, 1), ("2024-05-01T12:30:00", "1")])
+def test_list_posts_rejects_mistyped_cursor(client, schema, v, id_):
+    cursor = encode_cursor({"v": v, "id": id_, "s": "created_at", "o": "desc"})
+    response = client.get("/posts", params={"pagination": "cursor", "cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "INVALID_CURSOR"
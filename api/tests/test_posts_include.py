@@ -0,0 +1,116 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, event
+
+import cache
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from models import Comments, Post, User
+from services import comments as comments_service
+
+
+@pytest.fixture(scope="module", autouse=True)
+def posts(schema):
+    """ 60 posts spread over 20 authors, so bigger pages need more distinct authors """
+    with SessionLocal() as db:
+        users = [User(username=f"author-{i}", email=f"author-{i}@example.com", password_hash="!") for i in range(20)]
+        db.add_all(users)
+        db.flush()
+        now = datetime.utcnow()
+        db.add_all(
+            Post(
+                title=f"post {i}",
+                content="content",
+                user_id=users[i % len(users)].id,
+                created_at=now - timedelta(minutes=i),
+                updated_at=now - timedelta(minutes=i),
+                comments_count=i % 4,
+            )
+            for i in range(60)
+        )
+        db.commit()
+    yield
+    with SessionLocal() as db:
+        db.execute(delete(Comments))
+        db.execute(delete(Post))
+        db.execute(delete(User).where(User.username.like("author-%")))
+        db.commit()
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+def cold_cache():
+    cache.set_backend(cache.MemoryBackend())
+    cache.local.clear()
+
+
+@pytest.mark.parametrize("pagination", ["offset", "cursor"])
+def test_include_statement_count_does_not_grow_with_page_size(client, pagination):
+    counts = []
+    for limit in (5, 50):
+        cold_cache()
+        with count_statements() as statements:
+            response = client.get("/posts", params={
+                "limit": limit, "include": "author,comment_count",
+                "pagination": pagination, "exact_total": "false",
+            })
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == limit
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1], counts
+
+
+def test_include_response_shape(client):
+    response = client.get("/posts", params={"limit": 10, "include": "author,comment_count"})
+
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) == 10
+    for item in items:
+        assert item["author"]["id"] == item["user_id"]
+        assert item["author"]["username"].startswith("author-")
+        assert isinstance(item["comment_count"], int)
+
+    plain = client.get("/posts", params={"limit": 10}).json()["items"]
+    assert all("author" not in item and "comment_count" not in item for item in plain)
+
+
+def test_comment_updates_count_on_cached_page(client):
+    params = {"limit": 10, "include": "comment_count"}
+    before = {item["id"]: item["comment_count"] for item in client.get("/posts", params=params).json()["items"]}
+    post_id = next(iter(before))
+    with SessionLocal() as db:
+        commenter = db.query(User).filter(User.username == "author-0").one().id
+
+    async def comment():
+        try:
+            async with AsyncSessionLocal() as db:
+                await comments_service.create_comment(db, post_id, "first", commenter)
+        finally:
+            await async_engine.dispose()
+    asyncio.run(comment())
+
+    after = {item["id"]: item["comment_count"] for item in client.get("/posts", params=params).json()["items"]}
+    assert after[post_id] == before[post_id] + 1
+    assert {k: v for k, v in after.items() if k != post_id} == {k: v for k, v in before.items() if k != post_id}
+
+
+def test_unknown_include_is_rejected(client):
+    response = client.get("/posts", params={"include": "author,likers"})
+    assert response.status_code == 400
+    assert response.json()["error"]["code"] == "INVALID_INCLUDE"
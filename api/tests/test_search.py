@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, select
+
+import search
+from database import AsyncSessionLocal, SessionLocal, async_engine
+from models import Post
+
+
+@pytest.fixture
+def posts(schema):
+    with SessionLocal() as db:
+        db.add_all([
+            Post(title="Running late", content="Lorem ipsum dolor sit amet"),
+            Post(title="post 12", content="consectetur adipiscing"),
+            Post(title="post 123", content="sed do eiusmod"),
+        ])
+        db.commit()
+    yield
+    with SessionLocal() as db:
+        db.execute(delete(Post))
+        db.commit()
+
+
+def titles(index: search.InvertedIndex, *terms: str):
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                results = []
+                for term in terms:
+                    stmt = await index.apply(db, select(Post.title).order_by(Post.id), term)
+                    results.append((await db.scalars(stmt)).all())
+                return results
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(run())
+
+
+def test_matches_words_prefixes_and_substrings_like_postgres(posts):
+    words, prefix, inside_word, phrase, neither = titles(
+        search.InvertedIndex(), "lorem dolor", "run", "sectetu", "post 12", "lorem eiusmod"
+    )
+
+    assert words == ["Running late"]
+    assert prefix == ["Running late"]
+    # no word starts with it, but ILIKE '%sectetu%' matches on Postgres
+    assert inside_word == ["post 12"]
+    assert phrase == ["post 12", "post 123"]
+    assert neither == []
+
+
+def test_rebuilds_after_a_write_from_another_worker(posts):
+    index, other_worker = search.InvertedIndex(), search.InvertedIndex()
+    assert titles(index, "zebra") == [[]]
+
+    with SessionLocal() as db:
+        post = Post(title="zebra crossing", content="")
+        db.add(post)
+        db.commit()
+        db.refresh(post)
+    asyncio.run(other_worker.index_post(post))
+
+    assert titles(index, "zebra") == [["zebra crossing"]]
+
+
+def test_own_writes_do_not_rebuild(posts, monkeypatch):
+    index = search.InvertedIndex()
+    titles(index, "lorem")
+
+    with SessionLocal() as db:
+        post = Post(title="quokka", content="")
+        db.add(post)
+        db.commit()
+        db.refresh(post)
+    asyncio.run(index.index_post(post))
+
+    def no_rebuild(*args):
+        raise AssertionError("index was rebuilt")
+    monkeypatch.setattr(index, "_reset", no_rebuild)
+    assert titles(index, "quokk") == [["quokka"]]
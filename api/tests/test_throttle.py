@@ -0,0 +1,30 @@
+import asyncio
+
+from throttle import SlidingWindowLimiter
+
+
+def test_sliding_window_on_memory_backend():
+    limiter = SlidingWindowLimiter("test", limit=2, window_seconds=60)
+
+    async def run():
+        assert not await limiter.is_blocked("1.2.3.4")
+        await limiter.record("1.2.3.4")
+        await limiter.record("1.2.3.4")
+        assert await limiter.is_blocked("1.2.3.4")
+        assert not await limiter.is_blocked("5.6.7.8")
+        await limiter.reset("1.2.3.4")
+        assert not await limiter.is_blocked("1.2.3.4")
+
+    asyncio.run(run())
+
+
+def test_window_expires_old_events():
+    limiter = SlidingWindowLimiter("test", limit=1, window_seconds=0.05)
+
+    async def run():
+        await limiter.record("subject")
+        assert await limiter.is_blocked("subject")
+        await asyncio.sleep(0.1)
+        assert not await limiter.is_blocked("subject")
+
+    asyncio.run(run())
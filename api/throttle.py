@@ -0,0 +1,42 @@
+import cache
+from logging_config import get_logger
+
+logger = get_logger("throttle")
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter per subject on the cache backend: a Redis sorted
+    set with one member per event scored by its timestamp (an in-process list
+    with the memory backend), trimmed to the window on every check.
+    Fails open when the backend is unavailable.
+    """
+
+    def __init__(self, prefix: str, limit: int, window_seconds: float) -> None:
+        self.prefix = prefix
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+    def _key(self, subject: str) -> str:
+        return f"throttle:{self.prefix}:{subject}"
+
+    async def is_blocked(self, subject: str) -> bool:
+        key = self._key(subject)
+        try:
+            return await cache.get_backend().window_count(key, self.window_seconds) >= self.limit
+        except Exception as e:
+            logger.error("Throttle check failed for %s: %s", key, e)
+            return False
+
+    async def record(self, subject: str) -> None:
+        key = self._key(subject)
+        try:
+            await cache.get_backend().window_add(key, self.window_seconds)
+        except Exception as e:
+            logger.error("Throttle record failed for %s: %s", key, e)
+
+    async def reset(self, subject: str) -> None:
+        try:
+            await cache.get_backend().delete(self._key(subject))
+        except Exception as e:
+            logger.error("Throttle reset failed for %s: %s", subject, e)